@@ -0,0 +1,213 @@
+"""Benchmark ของ pipeline กรอง / render / บันทึก โดยใช้ข้อมูลจริงใน archive (result_*.json หรือ archive/*.ndjson.gz)
+ขยายเป็นชุดข้อมูลสังเคราะห์ 10k–1M รายการ แล้ววัดเวลา, throughput และ peak memory ของแต่ละขั้นตอน
+
+ตัวอย่าง:
+    python benchmark.py                                  # 10,000 รายการ
+    python benchmark.py --sizes 10000 100000 --save-baseline
+    python benchmark.py --sizes 100000 --compare         # เทียบกับ bench_baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import daily_search as ds
+
+try:
+    import resource
+except ImportError:  # Windows — ไม่มี getrusage จึงไม่วัด RSS
+    resource = None
+
+BASELINE_FILE = "bench_baseline.json"
+
+
+def load_seed_rows(archive_dir):
+    """โหลดผลลัพธ์จริงจาก archive เป็นตัวตั้งต้นของชุดข้อมูลสังเคราะห์"""
+    ds.OUTPUT_DIR = archive_dir
+    rows = [r for _, r in ds.iter_archive()]
+    if not rows:
+        raise SystemExit("❌ ไม่พบข้อมูลใน archive — ต้องมี result_*.json หรือ archive/*.ndjson.gz")
+    return rows
+
+
+def generate_corpus(seed_rows, n, seed=0, dup_rate=0.1):
+    """สร้าง hit สังเคราะห์ n รายการจากแถวจริง: URL ไม่ซ้ำกัน (ยกเว้นส่วน dup_rate ที่ตั้งใจให้ซ้ำเพื่อวัด dedup)
+    ส่วน title/snippet สุ่มสลับจากแถวจริง ทำให้สัดส่วน valid/reject และความยาวข้อความใกล้ของจริง"""
+    rnd = random.Random(seed)
+    corpus = []
+    for i in range(n):
+        base = rnd.choice(seed_rows)
+        other = rnd.choice(seed_rows)
+        if corpus and rnd.random() < dup_rate:
+            url = corpus[rnd.randrange(len(corpus))]["link"]
+        else:
+            url = f"{base.get('link', 'https://example.go.th/')}#bench{i}"
+        corpus.append({
+            "title": base.get("title", ""),
+            "link": url,
+            "snippet": other.get("snippet", ""),
+            "date": base.get("date", ""),
+            "position": i % 100 + 1,
+            "_found_in": rnd.choice(("1d", "7d", "1m")),
+            "_found_at": f"{rnd.randrange(24):02d}:{rnd.randrange(60):02d}",
+        })
+    return corpus
+
+
+def reset_peak_rss():
+    """Linux: รีเซ็ต high-water mark ของ RSS เป็นค่าปัจจุบัน ให้ peak_rss_mb() วัดแยกได้ทีละ case
+    OS อื่นรีเซ็ตไม่ได้ — ค่าที่อ่านได้คือ peak สะสมของทั้ง process ตั้งแต่เริ่มรัน"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """peak RSS ของ process (MB) หรือ None ถ้าวัดไม่ได้ (Windows)"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1e6 if sys.platform == "darwin" else maxrss / 1024  # macOS รายงานเป็น bytes, Linux เป็น KB
+
+
+def measure(fn, setup=None):
+    """คืน (วินาที, peak MB ที่ allocate ระหว่างรัน, peak RSS MB ระหว่างรอบที่จับเวลา)
+    จับเวลาก่อนโดยไม่เปิด tracemalloc (tracemalloc ทำให้ช้าลงหลายเท่า) แล้วรันซ้ำอีกรอบเพื่อวัด memory
+    setup (ถ้ามี) ถูกเรียกก่อนทั้งสองรอบ เพื่อให้ทั้งสองรอบเริ่มจากไฟล์บนดิสก์สถานะเดียวกัน (ไม่นับเวลา)"""
+    if setup:
+        setup()
+    reset_peak_rss()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    rss = peak_rss_mb()
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return elapsed, peak, rss
+
+
+def run_suite(corpus, workdir):
+    ds.OUTPUT_DIR = workdir
+    date_str = "01_01_2000"
+    unique = list({r["link"]: r for r in corpus}.values())
+    hits = ds.extract_hits(unique)
+    jobs = [(0, "benchmark", "qdr:d")]
+    # รอบถัดมาของวันเดียวกัน: มี hit ใหม่/ยกระดับ 1% — save_daily_json ควรใช้เวลาตามส่วนที่เปลี่ยน
+    saved = {r["link"]: r for r in unique}
+    snapshot = ds.archive_snapshot(saved)
+    delta = dict(saved)
+    for r in unique[::100]:
+        delta[r["link"]] = dict(r, _found_in="1d", _upgraded_at="23:59")
+    archive_path = ds._archive_path(ds._report_date(date_str))
+
+    def no_archive():
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+
+    def saved_archive():
+        # ไฟล์ของวันที่บันทึกครบแล้ว 1 รอบ (gzip member เดียว) ตรงกับ snapshot
+        ds._write_archive(archive_path, saved.values())
+
+    cases = [
+        ("is_valid_result", len(corpus),
+         lambda: sum(ds.is_valid_result(r["link"], r["title"], r["snippet"]) for r in corpus)),
+        ("highlight_text", len(corpus),
+         lambda: [ds.highlight_text(r["snippet"]) for r in corpus]),
+        ("dedup+filter (merge_batches)", len(corpus),
+         lambda: ds.merge_batches(jobs, [[dict(r) for r in corpus]], {}, "00:00")),
+        ("save_daily_json", len(unique),
+         lambda: ds.save_daily_json(date_str, saved), no_archive),
+        ("save_daily_json (1% delta)", len(unique) // 100,
+         lambda: ds.save_daily_json(date_str, delta, snapshot), saved_archive),
+        ("load_daily_json", len(unique),
+         lambda: ds.load_daily_json(date_str), saved_archive),
+        ("extract_hits", len(unique),
+         lambda: ds.extract_hits(unique)),
+        ("generate_html_report", len(hits),
+         lambda: ds.generate_html_report(hits, date_str)),
+        ("build_supabase_payload", len(hits),
+         lambda: ds.build_supabase_payload(hits, "2000-01-01")),
+    ]
+
+    results = {}
+    for name, items, fn, *setup in cases:
+        elapsed, peak, rss = measure(fn, *setup)
+        results[name] = {
+            "seconds": round(elapsed, 4),
+            "items_per_sec": round(items / elapsed) if elapsed else None,
+            "peak_mb": round(peak, 2),
+            "peak_rss_mb": round(rss, 1) if rss is not None else None,
+        }
+    return results
+
+
+def _vs_baseline(value, base):
+    if not value or not base:
+        return ""
+    ratio = value / base
+    return f" ({ratio:.2f}x{' ⚠️' if ratio > 1.2 else ''})"
+
+
+def print_results(size, results, baseline=None):
+    print(f"\n📊 {size:,} hits" + ("  (เทียบกับ baseline ในวงเล็บ)" if baseline else ""))
+    for name, r in results.items():
+        base = (baseline or {}).get(str(size), {}).get(name) or {}
+        rss = f"{r['peak_rss_mb']:>8.1f} MB" if r["peak_rss_mb"] is not None else f"{'n/a':>11}"
+        print(f"   {name:<30} {r['seconds']:>9.3f} s{_vs_baseline(r['seconds'], base.get('seconds'))}"
+              f"  {r['items_per_sec'] or 0:>10,} items/s  peak {r['peak_mb']:>8.2f} MB"
+              f"  RSS {rss}{_vs_baseline(r['peak_rss_mb'], base.get('peak_rss_mb'))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline ของ daily_search.py")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000], help="จำนวน hit สังเคราะห์ (เช่น 10000 100000 1000000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--archive-dir", default=os.path.dirname(os.path.abspath(__file__)), help="โฟลเดอร์ที่มี archive ข้อมูลจริง")
+    parser.add_argument("--save-baseline", action="store_true", help=f"บันทึกผลเป็น {BASELINE_FILE}")
+    parser.add_argument("--compare", action="store_true", help=f"เทียบกับ {BASELINE_FILE}")
+    args = parser.parse_args()
+
+    seed_rows = load_seed_rows(args.archive_dir)
+    print(f"🌱 ใช้ {len(seed_rows):,} แถวจริงจาก archive เป็นต้นแบบ")
+
+    baseline = None
+    if args.compare and os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    all_results = {}
+    for size in args.sizes:
+        corpus = generate_corpus(seed_rows, size, seed=args.seed)
+        workdir = tempfile.mkdtemp(prefix="bench_")
+        try:
+            all_results[str(size)] = run_suite(corpus, workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print_results(size, all_results[str(size)], baseline)
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(all_results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 บันทึก baseline ลง {BASELINE_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,184 +1,824 @@
 import json
 import os
 import re
+import time
+import random
+import threading
+import hashlib
+import gzip
+import base64
+import bisect
+import io
+import sqlite3
+import zlib
+import tempfile
+from array import array
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime, timedelta, date
-import urllib.request
 import urllib.parse
-import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from html import escape
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
-SERPER_API_KEY = os.getenv("SERPER_API_KEY")
-
-if not SERPER_API_KEY or SERPER_API_KEY == "YOUR_SERPER_API_KEY_HERE":
-    key_file = os.path.join(os.path.dirname(__file__), "serper_key.txt")
-    if os.path.exists(key_file):
-        try:
-            with open(key_file, "r", encoding="utf8") as f:
-                SERPER_API_KEY = f.read().strip()
-        except: pass
-
-if not SERPER_API_KEY:
-    import sys
-    print("❌ ERROR: ไม่พบ SERPER_API_KEY")
-    print("กรุณาตั้งค่า Environment Variable ชื่อ SERPER_API_KEY หรือสร้างไฟล์ serper_key.txt แล้วใส่ API Key ลงไป")
-    sys.exit(1)
-
-# Global Google-level exclusions for all queries to improve depth
-# (Excluded led.go.th, youtube, etc. to open space for other results)
-GOOGLE_EXCLUDES = "-site:led.go.th -site:youtube.com -site:x.com -site:instagram.com -site:tiktok.com -site:bidding.pea.co.th -site:gprocurement.go.th -site:prd.go.th -บังคับคดี -\"รอขาย\" -\"ธนาคารยึด\" -\"ที่ดิน\""
-
-# Broad exclusion for AOJ/AOT/Municipalities to use in CORE queries (to prevent them from dominating)
-LOCAL_DOMINANCE_EXCLUDES = "-อบต -เทศบาล -\"องค์การบริหารส่วนตำบล\" -\"องค์การบริหารส่วนจังหวัด\" -อบจ"
-
-# Regional Province Lists
-PROVINCES_NORTH = "เชียงใหม่ OR เชียงราย OR น่าน OR พะเยา OR แพร่ OR แม่ฮ่องสอน OR ลำปาง OR ลำพูน OR อุตรดิตถ์"
-PROVINCES_NE = "กาฬสินธุ์ OR ขอนแก่น OR ชัยภูมิ OR นครพนม OR นครราชสีมา OR โคราช OR บึงกาฬ OR บุรีรัมย์ OR มหาสารคาม OR มุกดาหาร OR ยโสธร OR ร้อยเอ็ด OR เลย OR ศรีสะเกษ OR สกลนคร OR สุรินทร์ OR หนองคาย OR หนองบัวลำภู OR อำนาจเจริญ OR อุดรธานี OR อุบลราชธานี"
-PROVINCES_CENTRAL = "กรุงเทพ OR นนทบุรี OR ปทุมธานี OR สมุทรปราการ OR อยุธยา OR สุโขทัย OR พิษณุโลก OR นครสวรรค์ OR กำแพงเพชร OR ชัยนาท OR นครนายก OR นครปฐม OR พิจิตร OR เพชรบูรณ์ OR ลพบุรี OR สมุทรสงคราม OR สมุทรสาคร OR สระบุรี OR สิงห์บุรี OR สุพรรณบุรี OR อ่างทอง OR อุทัยธานี"
-PROVINCES_EAST = "จันทบุรี OR ฉะเชิงเทรา OR ชลบุรี OR ตราด OR ปราจีนบุรี OR ระยอง OR สระแก้ว"
-PROVINCES_WEST = "กาญจนบุรี OR ตาก OR ประจวบคีรีขันธ์ OR เพชรบุรี OR ราชบุรี"
-PROVINCES_SOUTH = "กระบี่ OR ชุมพร OR ตรัง OR นครศรีธรรมราช OR นราธิวาส OR ปัตตานี OR พังงา OR พัทลุง OR ภูเก็ต OR ระนอง OR สตูล OR สงขลา OR สุราษฎร์ธานี OR ยะลา"
-
-# List of unique search queries organized by groups
-QUERIES = [
-    # --- หมวด A: CORE BROAD SEARCH (เน้นหน่วยงานส่วนกลาง/ภูมิภาค โดยกันท้องถิ่นออกเพื่อความลึก) ---
-    f"(\"ขายทอดตลาดพัสดุ\" OR \"ขายทอดตลาดครุภัณฑ์\" OR \"ขายทอดตลาดทรัพย์สิน\" OR \"ขายทอดตลาดวัสดุ\") {GOOGLE_EXCLUDES} {LOCAL_DOMINANCE_EXCLUDES}",
-    f"\"ขายทอดตลาด\" (\"พัสดุชำรุด\" OR \"ครุภัณฑ์ชำรุด\" OR \"พัสดุเสื่อมสภาพ\" OR \"ครุภัณฑ์เสื่อมสภาพ\" OR \"ไม่จำเป็นต้องใช้\") {GOOGLE_EXCLUDES} {LOCAL_DOMINANCE_EXCLUDES}",
-    f"(\"ประกาศขายทอดตลาด\" OR \"ประมูลขายทอดตลาด\") (\"พัสดุ\" OR \"ครุภัณฑ์\" OR \"ทรัพย์สิน\") {GOOGLE_EXCLUDES} {LOCAL_DOMINANCE_EXCLUDES}",
-    f"(\"จำหน่ายพัสดุ\" OR \"จำหน่ายครุภัณฑ์\" OR \"ขายพัสดุ\" OR \"ขายครุภัณฑ์\") (\"ชำรุด\" OR \"เสื่อมสภาพ\" OR \"ไม่จำเป็นต้องใช้\") {GOOGLE_EXCLUDES} {LOCAL_DOMINANCE_EXCLUDES}",
-    f"(\"จำหน่ายพัสดุ\" OR \"จำหน่ายครุภัณฑ์\") (\"วิธีเฉพาะเจาะจง\" OR \"วิธีเจรจาตกลงราคา\" OR \"เฉพาะเจาะจง\" OR \"เจรจาตกลงราคา\") {GOOGLE_EXCLUDES} {LOCAL_DOMINANCE_EXCLUDES}",
-
-    # --- หมวด B: LOCAL AGENCIES (เจาะจง อบจ./อบต./เทศบาล โดยเฉพาะ) ---
-    f"+\"องค์การบริหารส่วนจังหวัด\" +\"ขายทอดตลาด\" {GOOGLE_EXCLUDES}",
-    f"+\"องค์การบริหารส่วนตำบล\" +\"ขายทอดตลาด\" {GOOGLE_EXCLUDES}",
-    f"+\"เทศบาล\" +\"ขายทอดตลาด\" {GOOGLE_EXCLUDES}",
-    f"+\"อบจ\" +\"ขายทอดตลาด\" {GOOGLE_EXCLUDES}",
-    f"+\"อบต\" +\"ขายทอดตลาด\" {GOOGLE_EXCLUDES}",
-
-    # --- หมวด C: REGIONAL PROVINCIAL SEARCH (เจาะจงรายภาค/รายจังหวัด) ---
-    f"\"ขายทอดตลาด\" (พัสดุ OR ครุภัณฑ์) ({PROVINCES_NORTH}) {GOOGLE_EXCLUDES}",
-    f"\"ขายทอดตลาด\" (พัสดุ OR ครุภัณฑ์) ({PROVINCES_NE}) {GOOGLE_EXCLUDES}",
-    f"\"ขายทอดตลาด\" (พัสดุ OR ครุภัณฑ์) ({PROVINCES_CENTRAL}) {GOOGLE_EXCLUDES}",
-    f"\"ขายทอดตลาด\" (พัสดุ OR ครุภัณฑ์) ({PROVINCES_EAST}) {GOOGLE_EXCLUDES}",
-    f"\"ขายทอดตลาด\" (พัสดุ OR ครุภัณฑ์) ({PROVINCES_WEST}) {GOOGLE_EXCLUDES}",
-    f"\"ขายทอดตลาด\" (พัสดุ OR ครุภัณฑ์) ({PROVINCES_SOUTH}) {GOOGLE_EXCLUDES}",
-
-    # --- หมวด D: SPECIFIC ENTITIES & CATEGORIES (หน่วยงานเจาะจงและหมวดหมู่) ---
-    f"+\"สำนักงาน\" +\"จังหวัด\" +\"ขายทอดตลาด\" {GOOGLE_EXCLUDES} {LOCAL_DOMINANCE_EXCLUDES}",
-    f"+\"โรงเรียน\" +\"ขายทอดตลาด\" {GOOGLE_EXCLUDES}",
-    f"+\"โรงพยาบาล\" +\"ขายทอดตลาด\" {GOOGLE_EXCLUDES}",
-    f"+\"มหาวิทยาลัย\" +\"ขายทอดตลาด\" {GOOGLE_EXCLUDES}",
-    f"+\"สำนักงานเขตพื้นที่การศึกษา\" +\"ขายทอดตลาด\" {GOOGLE_EXCLUDES}",
-    f"+\"กรม\" +\"กอง\" +\"สำนัก\" +\"ขายทอดตลาด\" {GOOGLE_EXCLUDES}",
-    f"+\"ศาล\" +\"ศูนย์\" +\"องค์การ\" +\"ขายทอดตลาด\" {GOOGLE_EXCLUDES}",
-    f"\"ขายทอดตลาด\" (รถยนต์ OR รถตู้ OR รถบรรทุก OR ยานพาหนะ OR \"ครุภัณฑ์ยานพาหนะ\") {GOOGLE_EXCLUDES}",
-    f"\"ขายทอดตลาด\" (อาคาร OR \"สิ่งปลูกสร้าง\" OR รื้อถอน) {GOOGLE_EXCLUDES}",
-    f"\"ขายทอดตลาด\" (ครุภัณฑ์ OR เครื่องมือ) (การแพทย์ OR โรงพยาบาล OR สาธารณสุข) {GOOGLE_EXCLUDES}",
-
-    # --- หมวด F: SPECIFIC AUCTION METHODS (หมวดคำศัพท์เฉพาะใหม่) ---
-    f"(\"โดยวิธีขายทอดตลาด\" OR \"ขายทอดตลาดพัสดุ\" OR \"ขายทอดตลาดครุภัณฑ์\") -ป.ป.ช. {GOOGLE_EXCLUDES}",
-    f"(\"ไม่จำเป็นต้องใช้ในราชการ\" OR \"พัสดุชำรุดเสื่อมสภาพ\") -ป.ป.ช. {GOOGLE_EXCLUDES}",
-
-    # --- หมวด E: SPECIAL DOMAINS (เจาะเป้าหมายตรง) ---
-    "\"ขายทอดตลาด\" (site:webportal.bangkok.go.th OR site:coj.go.th)",
-    "\"ขายทอดตลาด\" site:prd.go.th",
-    "\"ขายทอดตลาด\" site:ac.th"
-]
-
-# Filtering Words (Python Level)
-NEG_WORDS = [
-    "รปภ", "มือสอง", "ทุบตึก", "ตัวแทน", "เช่าซื้อ", "อาคารพาณิชย์", "ขายอาคาร",
-    "บังคับคดี", "รอขาย", "ธนาคารยึด", "ที่ดิน", "ธนาคาร", "ไหม",
-    "ยึดบ้าน", "วางแนวยึด", "อายัด", "ยึดอายัด", "คู่มือปฏิบัติงาน"
-]
-NEGATIVE_WORDS = [w for w in NEG_WORDS if w != "อย่างไร"]
-
-# News sites and other noisy domains to filter in Python
-NEGATIVE_DOMAINS = [
-    "dailynews.co.th", "line.me", "auct.co.th", "mgronline.com", 
-    "sia.co.th", "bam.co.th", "threads.net", "naewna.com"
-]
-
-HIGHLIGHT_WORDS = [
-    "ขายทอดตลาด", "จำหน่าย", "ประกาศขาย", "เสื่อมสภาพ", "ชำรุด", "ไม่จำเป็นต้องใช้งาน",
-    "ไม่จำเป็นต้องใช้ในราชการ", "โดยวิธีขายทอดตลาด", "ขายทอดตลาดพัสดุ", 
-    "ไม่จำเป็นต้องใช้ในราชการ", "พัสดุชำรุดเสื่อมสภาพ", "ขายทอดตลาดครุภัณฑ์"
-]
+# คำค้น / คำกรอง / รายชื่อจังหวัด อยู่ใน search_config.json — โหลดครั้งแรกที่ถูกใช้ผ่าน load_config()
+# (import module นี้เพื่อประมวลผลข้อมูลออฟไลน์จึงไม่ต้องมี API key และไม่อ่านไฟล์ใดๆ)
+CONFIG_FILE = os.getenv("SEARCH_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_config.json"))
+SERPER_KEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serper_key.txt")
 
 OUTPUT_DIR = "." if os.getenv("GITHUB_ACTIONS") else "D:/project deep search"
 # ── Supabase ──────────────────────────────────────────────────────────────────
 SUPABASE_URL = os.getenv("SUPABASE_URL", "https://pfnhxozecazjxjgpfrzu.supabase.co")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "sb_publishable_9idaI5irCf8jia0qABYyhA_P5VoRRBo")
+SUPABASE_SINK = os.getenv("SUPABASE_SINK")  # path ของ SQLite ที่ใช้แทน Supabase จริง (โหมด replay ตั้งให้อัตโนมัติ)
 ALLOWED_SUFFIXES = (".go.th", ".ac.th", ".or.th")
+MANIFEST_FILE = "reports_manifest.json"   # รายการรายงานรายวัน (วันที่จริง, จำนวนรายการ, ขนาดไฟล์)
+STATE_DIR = "state"                       # state ข้ามวันแบบข้อความ (state/<table>.ndjson เรียงตาม key) ที่ commit ขึ้น repo
+ARCHIVE_DIR = "archive"                   # ผลลัพธ์รายวันแบบ NDJSON+gzip (archive/yyyy-mm-dd.ndjson.gz)
+ARCHIVE_FIELDS = ("title", "link", "snippet", "date", "position")  # + ทุก field ที่ขึ้นต้นด้วย "_"
+ARCHIVE_COMPACT_RATIO = 0.5               # บีบอัดไฟล์รายวันใหม่ทั้งไฟล์เมื่อบรรทัดเก่าที่ถูกแทนที่เกินสัดส่วนนี้ของจำนวนแถว
+SKIP_SEEN_URLS = os.getenv("SKIP_SEEN_URLS", "1") == "1"  # ไม่แสดง/ไม่ upsert URL ที่เคยรายงานไปแล้วในวันก่อน
+SEARCH_DIR = "search"                     # ดัชนีค้นหาข้ามวันแบบ static (search/meta.json + search/yyyy-mm/terms_*.json, docs_*.json, urls.txt)
+SEARCH_TERM_SHARDS = 64                   # จำนวนไฟล์ posting (หน้า search.html โหลดเฉพาะ shard ของ bigram ในคำค้น)
+SEARCH_DOC_SHARD_SIZE = 1000              # จำนวนเอกสารต่อไฟล์ docs_*.json
+METRICS_DIR = "metrics"                   # สถิติรอบละ 1 บรรทัด ต่อท้ายไฟล์รายเดือน (metrics/yyyy-mm.ndjson)
+METRICS_QUERY_FIELDS = ("index", "tbs", "status", "seconds", "raw", "duplicate", "valid", "new", "rejected")  # ลำดับค่าใน "queries"
+METRICS_PROM_FILE = os.getenv("METRICS_PROM_FILE")  # path ของ Prometheus textfile (node_exporter) — ไม่ตั้งคือไม่เขียน
+
+# ── Supabase sync ─────────────────────────────────────────────────────────────
+SUPABASE_WORKERS = int(os.getenv("SUPABASE_WORKERS", "4"))  # จำนวน batch ที่ส่งพร้อมกัน
+SUPABASE_BATCH_BYTES = 256 * 1024                           # ขนาด payload สูงสุดต่อ batch
+SUPABASE_BATCH_ROWS = 500
+
+DOMAIN_TOP_PATHS = 10        # จำนวน parent path ที่พบบ่อยสุดที่เก็บไว้ต่อ domain
+
+# ── Near-duplicate clustering ─────────────────────────────────────────────────
+# MinHash (one-permutation, 64 bins) บน character 5-gram ของ title+snippet + LSH 16 bands x 4 rows
+NEAR_DUP_THRESHOLD = 0.85    # สัดส่วน bin ที่ตรงกัน (≈ Jaccard) ขั้นต่ำที่ถือว่าเป็นประกาศเดียวกัน
+NEAR_DUP_WINDOW_DAYS = 30    # เทียบย้อนหลังกี่วัน (signature เก่ากว่านี้ถูกลบออกจาก state DB)
+MINHASH_BINS = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 5
+
+# ── Query scheduling ──────────────────────────────────────────────────────────
+# TTL ต่อ (query, tbs): ถ้ายิงไปแล้วและยังไม่หมดอายุ ผลของรอบก่อนอยู่ในไฟล์ของวันนี้แล้ว จึงข้ามได้
+# qdr:w / qdr:m ยิงแค่รอบแรกของวัน ส่วน query ที่ yield ต่ำ (URL ใหม่ต่อ call) จะถูกยืดรอบออกไป
+QUERY_TTL_HOURS = {"qdr:d": 0, "qdr:w": 24, "qdr:m": 24}
+LOW_YIELD_TTL_HOURS = {"qdr:d": 6, "qdr:w": 72, "qdr:m": 168}
+LOW_YIELD_THRESHOLD = 0.5    # ค่าเฉลี่ย URL ใหม่ต่อ call ต่ำกว่านี้ถือว่า low-yield
+LOW_YIELD_MIN_RUNS = 5       # ต้องมีประวัติอย่างน้อยกี่ครั้งก่อนตัดสิน
+YIELD_EWMA_ALPHA = 0.3
+FORCE_ALL_QUERIES = os.getenv("FORCE_ALL_QUERIES") == "1"  # ข้าม scheduler ยิงทุก query
+
+# ── Deep pagination (opt-in) ──────────────────────────────────────────────────
+# query ที่ yield สูงจะไล่หน้า 2, 3, ... ต่อ ตราบใดที่หน้าล่าสุดยังมี URL ใหม่ที่ผ่านการกรองมากพอ
+SERPER_DEEP_PAGES = int(os.getenv("SERPER_DEEP_PAGES", "0"))  # จำนวนหน้าเพิ่มสูงสุดต่อ query (0 = ปิด)
+DEEP_MIN_YIELD = 10.0        # ใช้กับ query ที่ yield_ewma >= ค่านี้ (หรือยังไม่มีประวัติ)
+DEEP_MIN_NEW_RATE = 0.2      # หน้าล่าสุดต้องมีสัดส่วน URL ใหม่ที่ valid อย่างน้อยเท่านี้จึงไปต่อ
+DEEP_PAGE_CONCURRENCY = 2    # ดึงทีละกี่หน้าพร้อมกัน
+
+SERPER_URL = os.getenv("SERPER_URL", "https://google.serper.dev/search")  # ชี้ไป stub server ในเครื่องได้
+
+# ── Concurrency / HTTP ────────────────────────────────────────────────────────
+SERPER_WORKERS = int(os.getenv("SERPER_WORKERS", "8"))      # จำนวน request ที่ยิงพร้อมกัน
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))       # timeout ต่อ request (วินาที)
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "4"))  # retry เมื่อเจอ 429/5xx หรือ connection หลุด
+HTTP_BACKOFF_BASE = 1.0                                     # วินาที — รอ base * 2^attempt (+ jitter)
+HTTP_BACKOFF_MAX = 30.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+# ==========================================
+# LAZY CONFIG
+# ==========================================
+_config = None
+_config_lock = threading.Lock()
+_serper_api_key = None
+
+def serper_api_key():
+    """คืน Serper API key (env SERPER_API_KEY หรือ serper_key.txt) — resolve ครั้งแรกที่จะยิง network จริงเท่านั้น"""
+    global _serper_api_key
+    if _serper_api_key is None:
+        key = os.getenv("SERPER_API_KEY")
+        if (not key or key == "YOUR_SERPER_API_KEY_HERE") and os.path.exists(SERPER_KEY_FILE):
+            try:
+                with open(SERPER_KEY_FILE, "r", encoding="utf8") as f:
+                    key = f.read().strip()
+            except: pass
+        if not key or key == "YOUR_SERPER_API_KEY_HERE":
+            raise RuntimeError("❌ ERROR: ไม่พบ SERPER_API_KEY\n"
+                               "กรุณาตั้งค่า Environment Variable ชื่อ SERPER_API_KEY หรือสร้างไฟล์ serper_key.txt แล้วใส่ API Key ลงไป")
+        _serper_api_key = key
+    return _serper_api_key
+
+class SearchConfig:
+    """search_config.json ที่ validate แล้ว: query ถูกแทน placeholder และ regex ถูก compile ไว้ครั้งเดียว"""
+    __slots__ = (
+        "queries", "query_categories", "monthly_query_markers", "provinces",
+        "negative_words", "negative_domains", "highlight_words",
+        "negative_domain_re", "negative_word_re", "highlight_re", "province_re",
+    )
+
+    def __init__(self, raw):
+        def word_list(key, container=raw):
+            value = container.get(key)
+            if not isinstance(value, list) or not value or not all(isinstance(w, str) and w for w in value):
+                raise ValueError(f"{CONFIG_FILE}: '{key}' ต้องเป็น list ของข้อความที่ไม่ว่าง")
+            return value
+
+        excludes = raw.get("excludes", {})
+        provinces = raw.get("provinces")
+        if not isinstance(excludes, dict) or not all(isinstance(v, str) for v in excludes.values()):
+            raise ValueError(f"{CONFIG_FILE}: 'excludes' ต้องเป็น object ของข้อความ")
+        if not isinstance(provinces, dict) or not provinces:
+            raise ValueError(f"{CONFIG_FILE}: 'provinces' ต้องเป็น object {{ภาค: [จังหวัด, ...]}}")
+        placeholders = dict(excludes)
+        for region in provinces:
+            placeholders[f"provinces_{region}"] = " OR ".join(word_list(region, provinces))
+
+        entries = raw.get("queries")
+        if not isinstance(entries, list) or not entries:
+            raise ValueError(f"{CONFIG_FILE}: 'queries' ต้องเป็น list ที่ไม่ว่าง")
+        self.queries, self.query_categories = [], []
+        for n, entry in enumerate(entries, 1):
+            if not isinstance(entry, dict) or not isinstance(entry.get("q"), str):
+                raise ValueError(f"{CONFIG_FILE}: queries[{n}] ต้องมี \"q\" เป็นข้อความ")
+            try:
+                self.queries.append(entry["q"].format_map(placeholders))
+            except (KeyError, ValueError) as e:
+                raise ValueError(f"{CONFIG_FILE}: queries[{n}] มี placeholder ที่ไม่รู้จัก {e}") from None
+            self.query_categories.append(entry.get("category", ""))
+        if len(set(self.queries)) != len(self.queries):
+            raise ValueError(f"{CONFIG_FILE}: มี query ซ้ำกัน")
+
+        self.monthly_query_markers = raw.get("monthly_query_markers", [])
+        self.provinces = [p for region in provinces for p in provinces[region]]
+        self.negative_words = word_list("negative_words")
+        self.negative_domains = word_list("negative_domains")
+        self.highlight_words = word_list("highlight_words")
+
+        self.negative_domain_re = re.compile(_keyword_pattern(self.negative_domains))
+        self.negative_word_re = re.compile(_keyword_pattern(self.negative_words))
+        self.highlight_re = re.compile(f"({_keyword_pattern(self.highlight_words)})", re.IGNORECASE)
+        # ชื่อจังหวัดที่เป็นคำทั่วไปด้วย (เผยแพร่, ไม่ได้เลย, ตากแดด) นับเฉพาะเมื่อมี "จังหวัด"/"จ." นำหน้า
+        self.province_re = re.compile(
+            rf"(?:จังหวัด|จ\.)\s*({_keyword_pattern(self.provinces)})"
+            rf"|({_keyword_pattern(p for p in self.provinces if p not in PROVINCE_AMBIGUOUS)})"
+        )
+
+def load_config():
+    """โหลด + validate search_config.json ครั้งแรกที่ถูกเรียก แล้วใช้ object เดิมตลอดการทำงาน"""
+    global _config
+    if _config is not None:  # ทางลัดไม่ต้องจับ lock — ถูกเรียกทุก hit ใน result_verdict / highlight_text / Hit
+        return _config
+    with _config_lock:
+        if _config is None:
+            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+                _config = SearchConfig(json.load(f))
+        return _config
+
+# ==========================================
+# HTTP TRANSPORT (keep-alive + retry/backoff)
+# ==========================================
+# connection ถูกเก็บแยกต่อ thread (http.client ไม่ thread-safe) และใช้ซ้ำข้าม request
+_http_local = threading.local()
+_http_stats = {}
+_http_stats_lock = threading.Lock()
+
+def _get_connection(scheme, netloc):
+    conns = getattr(_http_local, "conns", None)
+    if conns is None:
+        conns = _http_local.conns = {}
+    conn = conns.get((scheme, netloc))
+    if conn is None:
+        import http.client  # import ตอนใช้งานจริง (ดึง ssl/email มาด้วย ~40 ms) — งานออฟไลน์ไม่ต้องจ่าย
+        conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        conn = conns[(scheme, netloc)] = conn_cls(netloc, timeout=HTTP_TIMEOUT)
+    return conn
+
+def _drop_connection(scheme, netloc):
+    conn = getattr(_http_local, "conns", {}).pop((scheme, netloc), None)
+    if conn is not None:
+        conn.close()
+
+def _record_http(endpoint, elapsed, error=False, retry=False):
+    with _http_stats_lock:
+        st = _http_stats.setdefault(endpoint, {"calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0})
+        st["calls"] += 1
+        st["errors"] += int(error)
+        st["retries"] += int(retry)
+        st["total_ms"] += elapsed * 1000
+        st["max_ms"] = max(st["max_ms"], elapsed * 1000)
+
+def _backoff_delay(attempt, retry_after=None):
+    if retry_after:
+        try: return min(float(retry_after), HTTP_BACKOFF_MAX)
+        except ValueError: pass
+    # exponential backoff แบบ full jitter กัน worker ทุกตัวยิงซ้ำพร้อมกัน
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+def http_request(method, url, body=None, headers=None, endpoint=None):
+    """ส่ง HTTP request ผ่าน connection ที่ใช้ซ้ำได้ — retry เมื่อเจอ 429/5xx หรือ network error
+    คืนค่า body (bytes) เมื่อสำเร็จ, raise RuntimeError เมื่อ retry จนหมดหรือเจอ 4xx"""
+    parsed = urllib.parse.urlsplit(url)
+    path = parsed.path or "/"
+    if parsed.query:
+        path += "?" + parsed.query
+    endpoint = endpoint or f"{parsed.netloc}{parsed.path}"
+
+    import http.client
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        last_try = attempt == HTTP_MAX_RETRIES
+        started = time.perf_counter()
+        try:
+            conn = _get_connection(parsed.scheme, parsed.netloc)
+            conn.request(method, path, body=body, headers=headers or {})
+            resp = conn.getresponse()
+            data = resp.read()
+        except (http.client.HTTPException, OSError) as e:
+            _drop_connection(parsed.scheme, parsed.netloc)
+            _record_http(endpoint, time.perf_counter() - started, error=True, retry=not last_try)
+            if last_try:
+                raise RuntimeError(f"{endpoint}: {e}") from e
+            time.sleep(_backoff_delay(attempt))
+            continue
+
+        if resp.status in RETRY_STATUSES:
+            _record_http(endpoint, time.perf_counter() - started, error=True, retry=not last_try)
+            if last_try:
+                raise RuntimeError(f"{endpoint}: HTTP {resp.status} หลัง retry {HTTP_MAX_RETRIES} ครั้ง")
+            time.sleep(_backoff_delay(attempt, resp.getheader("Retry-After")))
+            continue
+        if resp.status >= 400:
+            _record_http(endpoint, time.perf_counter() - started, error=True)
+            raise RuntimeError(f"{endpoint}: HTTP {resp.status} {data[:200].decode('utf-8', 'replace')}")
+
+        _record_http(endpoint, time.perf_counter() - started)
+        return data
+
+def print_http_stats():
+    if not _http_stats:
+        return
+    print("\n📶 HTTP stats:")
+    for endpoint, st in sorted(_http_stats.items()):
+        avg = st["total_ms"] / st["calls"] if st["calls"] else 0
+        print(f"   {endpoint}: {st['calls']} calls, {st['errors']} errors, {st['retries']} retries, "
+              f"avg {avg:.0f} ms, max {st['max_ms']:.0f} ms")
+
+def supabase_upsert(table, rows, on_conflict):
+    """upsert ผ่าน PostgREST endpoint ของ Supabase โดยตรง (ใช้ transport เดียวกับ Serper)
+    ถ้าตั้ง SUPABASE_SINK ไว้ จะเขียนลง SQLite ในเครื่องแทน (ไม่มีการยิง network)"""
+    if SUPABASE_SINK:
+        return _sink_upsert(table, rows, on_conflict)
+    url = f"{SUPABASE_URL.rstrip('/')}/rest/v1/{table}?on_conflict={urllib.parse.quote(on_conflict)}"
+    headers = {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {SUPABASE_KEY}",
+        "Content-Type": "application/json",
+        "Prefer": "resolution=merge-duplicates,return=minimal",
+    }
+    body = json.dumps(rows, ensure_ascii=False).encode("utf-8")
+    http_request("POST", url, body=body, headers=headers, endpoint=f"supabase:{table}")
+
+_sink_lock = threading.Lock()
+
+def _sink_upsert(table, rows, on_conflict):
+    """upsert ลง SQLite แทน Supabase: 1 ตารางต่อ table, key = ค่าของคอลัมน์ on_conflict, row เก็บเป็น JSON"""
+    started = time.perf_counter()
+    with _sink_lock:
+        conn = sqlite3.connect(SUPABASE_SINK)
+        try:
+            with conn:
+                conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (key TEXT PRIMARY KEY, row TEXT NOT NULL, upserted_at TEXT NOT NULL)')
+                now = datetime.utcnow().isoformat(timespec="seconds")
+                conn.executemany(
+                    f'INSERT OR REPLACE INTO "{table}" (key, row, upserted_at) VALUES (?, ?, ?)',
+                    ((str(row[on_conflict]), json.dumps(row, ensure_ascii=False), now) for row in rows)
+                )
+        finally:
+            conn.close()
+    _record_http(f"sink:{table}", time.perf_counter() - started)
+
+# ==========================================
+# CASSETTE (record/replay ผลของ Serper)
+# ==========================================
+# record: เก็บ organic ของทุก (query, tbs, page) ลง cassette (NDJSON+gzip) ตอนจบรอบ
+# replay: search_serper อ่านจาก cassette แทนการยิง API — รันทั้ง pipeline ได้โดยไม่มี network/ไม่เสีย credit
+CASSETTE_FIELDS = ("title", "link", "snippet", "date", "position")
+_cassette_mode = None
+_cassette_path = None
+_cassette_scale = 1
+_cassette = {}
+_cassette_lock = threading.Lock()
+
+def open_cassette(path, mode, scale=1):
+    """mode = 'record' หรือ 'replay'; scale > 1 (เฉพาะ replay) ขยายทุก response เป็น scale เท่าด้วย URL ที่ไม่ซ้ำกัน"""
+    global _cassette_mode, _cassette_path, _cassette_scale
+    _cassette.clear()
+    _cassette_mode, _cassette_path, _cassette_scale = mode, path, max(1, scale)
+    if mode == "replay":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    _cassette[(entry["q"], entry["tbs"], entry.get("page", 1))] = entry["organic"]
+        print(f"📼 Replay: {len(_cassette)} responses จาก {path}" + (f" (x{_cassette_scale})" if _cassette_scale > 1 else ""))
+
+def close_cassette():
+    """โหมด record: เขียน cassette ลงไฟล์ (เรียงตาม key ให้ไฟล์เหมือนเดิมถ้า response เหมือนเดิม)"""
+    global _cassette_mode
+    if _cassette_mode == "record" and _cassette:
+        with atomic_write(_cassette_path, compress=True) as f:
+            for (q, tbs, page), organic in sorted(_cassette.items()):
+                f.write(json.dumps({"q": q, "tbs": tbs, "page": page, "organic": organic}, ensure_ascii=False) + "\n")
+        print(f"📼 Record: บันทึก {len(_cassette)} responses ลง {_cassette_path}")
+    _cassette_mode = None
+
+def _record_response(query, tbs, page, organic):
+    compact = [{k: r[k] for k in CASSETTE_FIELDS if k in r} for r in organic]
+    with _cassette_lock:
+        _cassette[(query, tbs, page)] = compact
+
+def _replay_response(query, tbs, page):
+    organic = _cassette.get((query, tbs, page), [])
+    if _cassette_scale == 1:
+        return [dict(r) for r in organic]
+    # สำเนาที่ k ได้ URL ใหม่ (fragment ต่างกัน) แต่ domain/path เดิม — dedup และ domain pool ทำงานเหมือนข้อมูลจริง
+    # title/snippet ถูกต่อท้ายด้วย hash ของ (k, URL) ยาวพอให้ Jaccard ต่ำกว่า NEAR_DUP_THRESHOLD
+    # ไม่อย่างนั้น near-dup จะรวมสำเนาทั้งหมดกลับเป็นแถวเดียว และขั้นตอนหลังจากนั้นไม่ได้รับโหลดที่ขยายจริง
+    return [_scaled_copy(r, k) for k in range(_cassette_scale) for r in organic if r.get('link')]
+
+def _scaled_copy(r, k):
+    if not k:
+        return dict(r)
+    tag = hashlib.sha256(f"{k}|{r['link']}".encode("utf-8")).hexdigest()
+    return dict(r, link=f"{r['link']}#x{k}", title=f"{r.get('title', '')} #{tag[:32]}",
+                snippet=f"{r.get('snippet', '')} #{tag[32:]}")
 
 
 # ==========================================
 # FUNCTIONS
 # ==========================================
 
-def search_serper(query, tbs):
-    url = "https://google.serper.dev/search"
-    payload = json.dumps({
+def search_serper(query, tbs, page=1):
+    """คืน list ของผล organic หรือ None ถ้า call ล้มเหลวหลัง retry ครบ (แยกจาก [] = ค้นสำเร็จแต่ไม่มีผล)"""
+    if _cassette_mode == "replay":
+        return _replay_response(query, tbs, page)
+    params = {
         "q": query,
         "tbs": tbs,
         "gl": "th",
         "hl": "th",
         "num": 100
-    })
-    headers = {'X-API-KEY': SERPER_API_KEY, 'Content-Type': 'application/json'}
+    }
+    if page > 1:
+        params["page"] = page
+    payload = json.dumps(params)
+    headers = {'X-API-KEY': serper_api_key(), 'Content-Type': 'application/json'}
     try:
-        req = urllib.request.Request(url, data=payload.encode('utf-8'), headers=headers, method='POST')
-        with urllib.request.urlopen(req) as response:
-            res_data = response.read().decode('utf-8')
-            return json.loads(res_data).get("organic", [])
+        res_data = http_request("POST", SERPER_URL, body=payload.encode('utf-8'), headers=headers, endpoint="serper:search")
+        organic = json.loads(res_data.decode('utf-8')).get("organic", [])
+        if _cassette_mode == "record":
+            _record_response(query, tbs, page, organic)
+        return organic
     except Exception as e:
         print(f"Error searching {query}: {e}")
-        return []
+        return None
 
-def is_valid_result(url, title, snippet):
+_page_executor = None
+_page_executor_lock = threading.Lock()
+
+def _get_page_executor():
+    # pool แยกจาก pool ของ main() — ถ้าใช้ pool เดียวกัน worker ที่รอหน้าถัดไปจะกิน slot จน deadlock ได้
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is None:
+            _page_executor = ThreadPoolExecutor(max_workers=max(1, SERPER_WORKERS))
+        return _page_executor
+
+def search_serper_deep(query, tbs, known_urls, max_pages):
+    """ดึงหน้าแรกแล้วไล่หน้าถัดไปทีละ DEEP_PAGE_CONCURRENCY หน้าพร้อมกัน ภายในงบ max_pages หน้าเพิ่ม
+    หยุดเมื่อหน้าล่าสุดมี URL ใหม่ที่ valid น้อยกว่า DEEP_MIN_NEW_RATE (ส่วนใหญ่อยู่ใน known_urls แล้ว) หรือหน้าว่าง"""
+    results = search_serper(query, tbs)
+    if results is None:
+        return None
+    seen = set(known_urls)
+    seen.update(r.get('link') for r in results)
+    next_page, last_page = 2, 1 + max_pages
+    while results and next_page <= last_page:
+        pages = list(range(next_page, min(next_page + DEEP_PAGE_CONCURRENCY, last_page + 1)))
+        fetched = list(_get_page_executor().map(lambda p: search_serper(query, tbs, page=p), pages))
+        next_page = pages[-1] + 1
+        for page in fetched:
+            if not page:  # หน้าว่างหรือล้มเหลว — หยุดที่ผลเท่าที่ได้ (หน้าแรกสำเร็จแล้ว จึงนับเป็น call ที่สำเร็จ)
+                return results
+            new_valid = 0
+            for r in page:
+                url = r.get('link')
+                if url and url not in seen and is_valid_result(url, r.get('title',''), r.get('snippet','')):
+                    new_valid += 1
+                seen.add(url)
+            results.extend(page)
+            if new_valid / len(page) < DEEP_MIN_NEW_RATE:
+                return results
+    return results
+
+def _keyword_pattern(words):
+    """รวมคำทั้งหมดเป็น regex เดียวแบบ trie (คำซ้ำถูกตัด, prefix ร่วมถูกรวมกิ่ง)
+    เช่น ขายทอดตลาด / ขายทอดตลาดพัสดุ -> ขายทอดตลาด(?:พัสดุ)? ซึ่ง greedy จึงได้คำที่ยาวที่สุดก่อนเสมอ
+    และที่แต่ละตำแหน่งของข้อความจะเดินได้แค่กิ่งเดียว — เวลาสแกนโตตามความยาวข้อความ ไม่ใช่จำนวนคำ"""
+    trie = {}
+    for word in set(words):
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+# regex ของคำกรองถูก compile ครั้งเดียวใน load_config() — ใช้ทั้งตอนกรองสดและตอน re-filter ข้อมูลย้อนหลัง
+MENU_SEPARATORS = (" · ", " | ", " > ", " - ")
+
+def result_verdict(url, title, snippet):
+    """คืน (ผ่าน/ไม่ผ่าน, เหตุผล) — เหตุผลบอกว่ากฎข้อไหนตัดสิน ใช้ตอน replay/วิเคราะห์การกรอง"""
+    cfg = load_config()
+    m = cfg.negative_domain_re.search(url.lower())
+    if m: return False, f"Negative Domain: {m.group()}"
     combined_text = f"{title} {snippet}".lower()
-    for domain in NEGATIVE_DOMAINS:
-        if domain in url.lower(): return False
-    for word in NEGATIVE_WORDS:
-        if word in combined_text: return False
+    m = cfg.negative_word_re.search(combined_text)
+    if m: return False, f"Negative Word: {m.group()}"
     
     # Menu pattern check
-    sep_count = sum([combined_text.count(sep) for sep in [" · ", " | ", " > ", " - "]])
-    if sep_count >= 3: return False
+    sep_count = sum(map(combined_text.count, MENU_SEPARATORS))
+    if sep_count >= 3: return False, "Likely Menu/Sitemap"
 
     # Highlight check
-    for word in HIGHLIGHT_WORDS:
-        if word in title or word in snippet: return True
-    return False
+    if cfg.highlight_re.search(title) or cfg.highlight_re.search(snippet): return True, "Valid"
+    return False, "No Keywords Found"
+
+def is_valid_result(url, title, snippet):
+    return result_verdict(url, title, snippet)[0]
 
 def highlight_text(text):
     if not text: return ""
-    highlighted = escape(text)
-    for word in HIGHLIGHT_WORDS:
-        highlighted = re.sub(f"({word})", r"<span class='highlight'>\1</span>", highlighted, flags=re.IGNORECASE)
-    return highlighted
+    return load_config().highlight_re.sub(r"<span class='highlight'>\1</span>", escape(text))
+
+# ==========================================
+# HIT RECORDS (สกัดข้อมูลครั้งเดียวหลังกรอง)
+# ==========================================
+# คำที่บอกประเภทหน่วยงาน / หมวดพัสดุ: คำแรกที่พบใน title (แล้วจึง snippet) เป็นตัวตัดสิน
+AGENCY_TYPES = {
+    "อบต.": ["อบต", "องค์การบริหารส่วนตำบล"],
+    "อบจ.": ["อบจ", "องค์การบริหารส่วนจังหวัด"],
+    "เทศบาล": ["เทศบาล"],
+    "โรงเรียน": ["โรงเรียน"],
+    "โรงพยาบาล": ["โรงพยาบาล", "สาธารณสุข"],
+    "มหาวิทยาลัย": ["มหาวิทยาลัย", "วิทยาลัย"],
+    "เขตพื้นที่การศึกษา": ["สำนักงานเขตพื้นที่การศึกษา", "สพป", "สพม"],
+    "ตำรวจ/ทหาร": ["สถานีตำรวจ", "ตำรวจภูธร", "กองบิน", "กองพัน", "กองทัพ", "ค่ายทหาร"],
+    "ชลประทาน": ["ชลประทาน"],
+    "รัฐวิสาหกิจ": ["การไฟฟ้า", "การประปา", "การยาสูบ", "ไปรษณีย์"],
+}
+ITEM_CATEGORIES = {
+    "vehicle": ["รถยนต์", "รถจักรยานยนต์", "รถบรรทุก", "รถตู้", "รถกระบะ", "รถพยาบาล", "รถโดยสาร", "ยานพาหนะ", "รถราชการ"],
+    "building": ["อาคาร", "สิ่งปลูกสร้าง", "บ้านพัก", "รื้อถอน"],
+    "medical": ["ครุภัณฑ์การแพทย์", "เครื่องมือแพทย์", "ทางการแพทย์", "วัสดุการแพทย์"],
+    "computer": ["คอมพิวเตอร์", "เครื่องพิมพ์", "ครุภัณฑ์สำนักงาน"],
+    "scrap": ["เศษวัสดุ", "ซากพัสดุ", "เศษเหล็ก", "ไม้ของกลาง", "ต้นไม้"],
+}
+PROVINCE_ALIASES = {"โคราช": "นครราชสีมา", "กรุงเทพ": "กรุงเทพมหานคร"}
+THAI_MONTHS = {
+    "มกราคม": 1, "ม.ค.": 1, "กุมภาพันธ์": 2, "ก.พ.": 2, "มีนาคม": 3, "มี.ค.": 3, "เมษายน": 4, "เม.ย.": 4,
+    "พฤษภาคม": 5, "พ.ค.": 5, "มิถุนายน": 6, "มิ.ย.": 6, "กรกฎาคม": 7, "ก.ค.": 7, "สิงหาคม": 8, "ส.ค.": 8,
+    "กันยายน": 9, "ก.ย.": 9, "ตุลาคม": 10, "ต.ค.": 10, "พฤศจิกายน": 11, "พ.ย.": 11, "ธันวาคม": 12, "ธ.ค.": 12,
+}
+
+def _label_lookup(groups):
+    return {word.lower(): label for label, words in groups.items() for word in words}
+
+_AGENCY_LABELS = _label_lookup(AGENCY_TYPES)
+_CATEGORY_LABELS = _label_lookup(ITEM_CATEGORIES)
+AGENCY_RE = re.compile(_keyword_pattern(_AGENCY_LABELS), re.IGNORECASE)
+CATEGORY_RE = re.compile(_keyword_pattern(_CATEGORY_LABELS), re.IGNORECASE)
+PROVINCE_AMBIGUOUS = {"แพร่", "เลย", "ตาก", "น่าน"}  # ดู SearchConfig.province_re
+THAI_DATE_RE = re.compile(rf"(\d{{1,2}})\s*({_keyword_pattern(THAI_MONTHS)})\s*(?:พ\.ศ\.\s*)?(25\d\d)")
+# "ยกเลิกประกาศขายทอดตลาด", "ยกเลิกการขายทอดตลาด ..." — ไม่นับเมนูเว็บจัดซื้อ "ประกาศยกเลิก สัญญา/ข้อตกลง ขายทอดตลาด"
+CANCELLED_RE = re.compile(r"ยกเลิก[^.…|·/]{0,30}?(?:ขายทอดตลาด|จำหน่ายพัสดุ|ประกาศขาย)")
+
+_SECOND_LEVEL_TH = {"go", "ac", "or", "co", "in", "mi", "net"}
+
+def _domain_suffix(netloc):
+    """'www.opsmoac.go.th' -> 'go.th', 'www.facebook.com' -> 'com' (ใช้เป็นตัวกรองในหน้ารายงาน)"""
+    labels = netloc.lower().split(":")[0].rstrip(".").split(".")
+    if len(labels) >= 3 and labels[-1] == "th" and labels[-2] in _SECOND_LEVEL_TH:
+        return ".".join(labels[-2:])
+    return labels[-1] if labels[-1] else "-"
+
+def _first_label(regex, labels, title, snippet):
+    m = regex.search(title) or regex.search(snippet)
+    return labels[m.group().lower()] if m else None
+
+def _announced_date(text):
+    """วันที่ พ.ศ. แรกในข้อความ เช่น '3 มี.ค. 2569' -> '2026-03-03' (None ถ้าไม่พบหรือวันที่ไม่ถูกต้อง)"""
+    for m in THAI_DATE_RE.finditer(text):
+        try:
+            return date(int(m.group(3)) - 543, THAI_MONTHS[m.group(2)], int(m.group(1))).isoformat()
+        except ValueError:
+            continue
+    return None
+
+class Hit:
+    """ผลค้นหาหนึ่งรายการหลังผ่านการกรอง — parse URL / สแกนคีย์เวิร์ดครั้งเดียว แล้วรายงาน, Supabase
+    และ domain pool ใช้ค่าที่สกัดไว้ร่วมกัน (archive ยังเก็บ dict ดิบตามเดิม)"""
+    __slots__ = (
+        "url", "title", "snippet", "found_in", "found_at", "dup_of", "alternates",
+        "domain", "suffix", "index_url", "keyword", "keywords",
+        "agency", "province", "category", "announced", "cancelled",
+    )
+
+    def __init__(self, r):
+        self.url = r.get('link', '')
+        self.title = r.get('title', '')
+        self.snippet = r.get('snippet', '')
+        self.found_in = r.get('_found_in', '7d')
+        self.found_at = r.get('_found_at', 'N/A')
+        self.dup_of = r.get('_dup_of')
+        self.alternates = r.get('_alternates', [])
+
+        parsed = urllib.parse.urlparse(self.url)
+        self.domain = parsed.netloc
+        self.suffix = _domain_suffix(parsed.netloc)
+        self.index_url = _index_url(parsed)
+
+        cfg = load_config()
+        snippet_hits = cfg.highlight_re.findall(self.snippet)
+        title_hits = cfg.highlight_re.findall(self.title)
+        # keyword หลักของแถว Supabase (keyword_hit): คำแรกตามลำดับ highlight_words ที่อยู่ใน snippet หรือ title
+        # แบบเดียวกับรุ่นก่อน — ค่าในตารางต้องไม่เปลี่ยนเพียงเพราะวิธีสแกนเปลี่ยน
+        self.keyword = next((kw for kw in cfg.highlight_words if kw in self.snippet or kw in self.title), None)
+        self.keywords = tuple(dict.fromkeys(kw.lower() for kw in title_hits + snippet_hits))
+
+        self.agency = _first_label(AGENCY_RE, _AGENCY_LABELS, self.title, self.snippet)
+        self.category = _first_label(CATEGORY_RE, _CATEGORY_LABELS, self.title, self.snippet)
+        m = cfg.province_re.search(self.title) or cfg.province_re.search(self.snippet)
+        province = m and (m.group(1) or m.group(2))
+        self.province = PROVINCE_ALIASES.get(province, province) if province else None
+        self.announced = _announced_date(f"{self.title} {self.snippet}")
+        self.cancelled = bool(CANCELLED_RE.search(self.title) or CANCELLED_RE.search(self.snippet))
+
+def extract_hits(results):
+    """dict ดิบจาก Serper -> Hit (เรียงตามลำดับเดิม)"""
+    return [Hit(r) for r in results if r.get('link')]
 
 def get_ict_now():
     return datetime.utcnow() + timedelta(hours=7)
 
-def load_daily_json(date_str):
-    filepath = os.path.join(OUTPUT_DIR, f"result_{date_str}.json")
-    if os.path.exists(filepath):
+_umask = None
+
+def _current_umask():
+    """umask ของ process — อ่านครั้งแรกที่เขียนไฟล์ ไม่ใช่ตอน import
+    Linux อ่านจาก /proc ได้โดยไม่ต้องเปลี่ยนค่า ที่อื่นต้องตั้งแล้วคืนค่าเดิม (os.umask อ่านอย่างเดียวไม่ได้)"""
+    global _umask
+    if _umask is None:
         try:
-            with open(filepath, 'r', encoding='utf-8') as f: return json.load(f)
-        except: pass
+            with open("/proc/self/status", "r") as f:
+                _umask = next(int(line.split()[1], 8) for line in f if line.startswith("Umask:"))
+        except (OSError, StopIteration):
+            _umask = os.umask(0o22)
+            os.umask(_umask)
+    return _umask
+
+@contextmanager
+def atomic_write(filepath, compress=False, binary=False):
+    """เขียนลงไฟล์ชั่วคราวในโฟลเดอร์เดียวกันแล้ว rename ทับ — ถ้าโปรแกรมล้มกลางทาง ไฟล์เดิมยังอยู่ครบ
+    ไม่มีไฟล์ครึ่งๆ กลางๆ ถูก commit ขึ้น repo (compress=True เขียนเป็น gzip, binary=True ได้ไฟล์ไบต์ดิบ)"""
+    dirname = os.path.dirname(filepath) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".tmp_", suffix=os.path.splitext(filepath)[1])
+    try:
+        if compress:
+            # filename="" และ mtime=0 ทำให้ไฟล์ gzip เหมือนเดิมทุกไบต์ถ้าข้อมูลไม่เปลี่ยน (git ไม่เห็นเป็น diff)
+            with os.fdopen(fd, "wb") as raw, \
+                 gzip.GzipFile(filename="", fileobj=raw, mode="wb", mtime=0) as gz, \
+                 io.TextIOWrapper(gz, encoding="utf-8") as f:
+                yield f
+        elif binary:
+            with os.fdopen(fd, "wb") as f:
+                yield f
+        else:
+            with os.fdopen(fd, "w", encoding="utf-8", buffering=1 << 16) as f:
+                yield f
+        os.chmod(tmp_path, 0o666 & ~_current_umask())  # mkstemp สร้างไฟล์เป็น 0600 — ให้สิทธิ์เหมือนไฟล์ที่สร้างด้วย open()
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try: os.unlink(tmp_path)
+        except OSError: pass
+        raise
+
+# ==========================================
+# RESULT ARCHIVE (NDJSON + gzip, 1 ไฟล์ต่อวัน)
+# ==========================================
+
+def _archive_path(day):
+    return os.path.join(OUTPUT_DIR, ARCHIVE_DIR, f"{day}.ndjson.gz")
+
+def _legacy_json_path(date_str):
+    return os.path.join(OUTPUT_DIR, f"result_{date_str}.json")
+
+def _compact_row(r):
+    """ตัด payload ของ Serper ที่ไม่ได้ใช้ (rating, attributes, sitelinks ...) เหลือเฉพาะ field ที่ pipeline ใช้"""
+    return {k: v for k, v in r.items() if k in ARCHIVE_FIELDS or k.startswith("_")}
+
+def _archive_line(r):
+    return json.dumps(_compact_row(r), ensure_ascii=False, separators=(",", ":"))
+
+def archive_snapshot(rows):
+    """{link: บรรทัด NDJSON} ของแถวตอนโหลด — ส่งให้ save_daily_json/save_rejected เพื่อเขียนเฉพาะแถวที่เปลี่ยน"""
+    return {url: _archive_line(r) for url, r in rows.items()}
+
+def _write_archive(path, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path, compress=True) as f:
+        for r in rows:
+            f.write(_archive_line(r))
+            f.write("\n")
+
+def _append_archive(path, lines):
+    """ต่อท้ายไฟล์ด้วย gzip member ใหม่ที่มีเฉพาะ lines — gzip หลาย member ต่อกันยังอ่านด้วย gzip.open ได้ตามปกติ
+    จึงไม่ต้อง compress ข้อมูลทั้งวันซ้ำทุกรอบ (คัดลอกไบต์เดิมผ่าน atomic_write เพื่อไม่ให้ไฟล์เสียถ้าล้มกลางทาง)"""
+    member = gzip.compress("".join(line + "\n" for line in lines).encode("utf-8"), mtime=0)
+    with atomic_write(path, binary=True) as f:
+        with open(path, "rb") as old:
+            f.write(old.read())
+        f.write(member)
+
+def _read_archive(path):
+    """แถวของไฟล์ archive ตามลำดับที่พบครั้งแรก — link ที่ถูกต่อท้ายหลายครั้งใช้บรรทัดหลังสุด"""
+    rows = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for n, line in enumerate(f):
+            if line.strip():
+                r = json.loads(line)
+                rows[r.get("link") or n] = r
+    return rows.values()
+
+def _save_archive(path, rows, before=None):
+    """เขียน rows ({link: row}) ลง path แล้วคืนจำนวนแถวที่เขียนจริง
+    ถ้ามีไฟล์อยู่แล้วและส่ง before (archive_snapshot ตอนโหลด) มา จะต่อท้ายเฉพาะแถวใหม่/ที่เปลี่ยน
+    แล้วเขียนใหม่ทั้งไฟล์เมื่อบรรทัดเก่าที่ถูกแทนที่เกิน ARCHIVE_COMPACT_RATIO ของจำนวนแถว"""
+    if before is None or not os.path.exists(path):
+        _write_archive(path, rows.values())
+        return len(rows)
+    changed = [line for url, line in ((url, _archive_line(r)) for url, r in rows.items()) if before.get(url) != line]
+    if not changed:
+        return 0
+    with gzip.open(path, "rb") as f:
+        lines = sum(1 for line in f if line.strip())
+    if lines + len(changed) - len(rows) > len(rows) * ARCHIVE_COMPACT_RATIO:
+        _write_archive(path, rows.values())
+        return len(rows)
+    _append_archive(path, changed)
+    return len(changed)
+
+def iter_day(date_str):
+    """stream ผลลัพธ์ของวันเดียวทีละแถว — อ่านจาก archive ก่อน ถ้ายังไม่ได้ migrate จะอ่าน result_*.json เดิม"""
+    path = _archive_path(_report_date(date_str))
+    if os.path.exists(path):
+        yield from _read_archive(path)
+        return
+    legacy = _legacy_json_path(date_str)
+    if os.path.exists(legacy):
+        with open(legacy, 'r', encoding='utf-8') as f:
+            yield from json.load(f).values()
+
+def archive_days(start=None, end=None):
+    """{yyyy-mm-dd: dd_mm_yyyy} ของทุกวันที่มีข้อมูล (ทั้ง archive และ JSON เดิม) เรียงตามวันที่
+    start/end เป็น 'yyyy-mm-dd' (รวมปลายทั้งสองข้าง) — ไม่ได้เปิดอ่านไฟล์ใดๆ"""
+    import glob
+    days = {}
+    for path in glob.glob(os.path.join(OUTPUT_DIR, "result_*.json")):
+        match = re.search(r"result_(\d+_\d+_\d+)\.json$", path)
+        if match:
+            days[_report_date(match.group(1))] = match.group(1)
+    for path in glob.glob(os.path.join(OUTPUT_DIR, ARCHIVE_DIR, "*.ndjson.gz")):
+        if path.endswith(".rejected.ndjson.gz"):
+            continue
+        day = os.path.basename(path)[:10]
+        days[day] = datetime.strptime(day, "%Y-%m-%d").strftime("%d_%m_%Y")
+    return {day: days[day] for day in sorted(days)
+            if (start is None or day >= start) and (end is None or day <= end)}
+
+def iter_archive(start=None, end=None):
+    """stream (yyyy-mm-dd, row) ของช่วงวันที่ — โหลดทีละวัน ไม่ต้องโหลดทั้ง archive"""
+    for day, date_str in archive_days(start, end).items():
+        for r in iter_day(date_str):
+            yield day, r
+
+def load_daily_json(date_str):
+    try:
+        return {r["link"]: r for r in iter_day(date_str) if r.get("link")}
+    except: pass
     return {}
 
-def save_daily_json(date_str, results_dict):
-    filepath = os.path.join(OUTPUT_DIR, f"result_{date_str}.json")
+def save_daily_json(date_str, results_dict, before=None):
+    """คืนจำนวนแถวที่เขียน — ส่ง before (archive_snapshot ตอนโหลด) มาเพื่อต่อท้ายเฉพาะแถวใหม่/ที่เปลี่ยน"""
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(results_dict, f, ensure_ascii=False, indent=2)
+        written = _save_archive(_archive_path(_report_date(date_str)), results_dict, before)
+        # วันนี้ถูกย้ายเข้า archive แล้ว ไม่ต้องเก็บ JSON เดิมซ้ำ
+        legacy = _legacy_json_path(date_str)
+        if os.path.exists(legacy):
+            os.remove(legacy)
+        return written
     except: pass
+    return 0
+
+def _rejected_path(day):
+    return os.path.join(OUTPUT_DIR, ARCHIVE_DIR, f"{day}.rejected.ndjson.gz")
+
+def iter_day_rejected(date_str):
+    """stream hit ที่ถูกกรองออกของวันนั้น (มี field _reject = เหตุผล) — มีเฉพาะวันที่บันทึกหลังเพิ่มฟีเจอร์นี้"""
+    path = _rejected_path(_report_date(date_str))
+    if os.path.exists(path):
+        yield from _read_archive(path)
+
+def load_rejected(date_str):
+    try:
+        return {r["link"]: r for r in iter_day_rejected(date_str) if r.get("link")}
+    except: pass
+    return {}
+
+def save_rejected(date_str, rejected, before=None):
+    try:
+        if rejected:
+            _save_archive(_rejected_path(_report_date(date_str)), rejected, before)
+    except: pass
+
+def migrate_archive(delete=False):
+    """แปลง result_*.json (indent=2, payload เต็ม) ทั้งหมดเป็น archive/yyyy-mm-dd.ndjson.gz
+    ตรวจว่าจำนวนแถวตรงกันก่อน แล้วจึงลบไฟล์เดิมเมื่อสั่ง delete=True"""
+    import glob
+    before = after = 0
+    for legacy in sorted(glob.glob(os.path.join(OUTPUT_DIR, "result_*.json"))):
+        match = re.search(r"result_(\d+_\d+_\d+)\.json$", legacy)
+        if not match:
+            continue
+        date_str = match.group(1)
+        with open(legacy, 'r', encoding='utf-8') as f:
+            rows = json.load(f)
+        path = _archive_path(_report_date(date_str))
+        _write_archive(path, rows.values())
+
+        migrated = sum(1 for _ in iter_day(date_str))
+        if migrated != len(rows):
+            print(f"❌ {os.path.basename(legacy)}: จำนวนแถวไม่ตรง ({len(rows)} -> {migrated}) ข้ามการลบไฟล์เดิม")
+            continue
+        before += os.path.getsize(legacy)
+        after += os.path.getsize(path)
+        print(f"📦 {os.path.basename(legacy)} -> {os.path.relpath(path, OUTPUT_DIR)} ({len(rows)} rows)")
+        if delete:
+            os.remove(legacy)
+    if before:
+        print(f"✅ Migrated: {before // 1024} KB -> {after // 1024} KB")
+
+def _report_row(hit, keyword_index):
+    """แถวแบบ compact สำหรับ JSON ที่ฝังในหน้ารายงาน:
+    [url, title_html, snippet_html, found_in, found_at, suffix, [keyword ids], [alternate urls],
+     agency, province, category, วันที่ประกาศ (dd/mm/พ.ศ.), ยกเลิก (0/1)]"""
+    announced = ""
+    if hit.announced:
+        y, m, d = hit.announced.split("-")
+        announced = f"{d}/{m}/{int(y) + 543}"
+    return [
+        hit.url,
+        highlight_text(hit.title),
+        highlight_text(hit.snippet),
+        hit.found_in,
+        hit.found_at,
+        hit.suffix,
+        [keyword_index.setdefault(kw, len(keyword_index)) for kw in hit.keywords],
+        hit.alternates,
+        hit.agency or "",
+        hit.province or "",
+        hit.category or "",
+        announced,
+        int(hit.cancelled),
+    ]
 
-def generate_html_report(results, date_str):
+def _script_json(obj):
+    # กันไม่ให้ข้อความในผลค้นหาปิด <script> ก่อนเวลา — ใช้ \u003c ซึ่งยังเป็น JSON ที่ JSON.parse อ่านได้ ("\!" ไม่ใช่ escape ของ JSON)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).replace("</", "\\u003c/").replace("<!--", "\\u003c!--")
+
+def generate_html_report(hits, date_str):
+    """หน้ารายงานรายวัน: ข้อมูลทั้งหมดฝังเป็น JSON ก้อนเดียว แล้วให้ browser render ทีละช่วงเมื่อเลื่อนลง
+    (วันที่มีหลายพันรายการจึงเปิดบนมือถือได้ทันที) พร้อมตัวกรองตามช่วงเวลา / โดเมน / คีย์เวิร์ด"""
     ict_now = get_ict_now()
     filename = f"result_{date_str}_daily.html"
     filepath = os.path.join(OUTPUT_DIR, filename)
@@ -194,7 +834,10 @@ def generate_html_report(results, date_str):
             body {{ font-family: Arial, sans-serif; background-color: #fff; margin:0; padding:20px 40px; color:#202124; }}
             .container {{ max-width: 652px; margin: 0; }}
             h1 {{ font-size:32px; font-weight:bold; border-bottom:3px solid #1a0dab; padding-bottom:10px; margin-bottom:20px; }}
-            .meta {{ font-size:14px; color:#70757a; margin-bottom:25px; border-bottom:1px solid #ebebeb; padding-bottom:15px; }}
+            .meta {{ font-size:14px; color:#70757a; margin-bottom:15px; }}
+            .filters {{ display:flex; flex-wrap:wrap; gap:8px; font-size:14px; margin-bottom:25px; border-bottom:1px solid #ebebeb; padding-bottom:15px; }}
+            .filters select, .filters input[type=search] {{ font-size:14px; padding:4px 6px; border:1px solid #dadce0; border-radius:4px; }}
+            .filters input[type=search] {{ flex:1; min-width:160px; }}
             .result-item {{ margin-bottom:28px; padding:10px 14px; border-left:4px solid transparent; border-radius:4px; position:relative; transition: background-color 0.25s, opacity 0.25s; }}
             .result-item.read {{ background-color:#f5f5f5; opacity:0.55; border-left-color:#bdbdbd; }}
             .result-item.read h3 {{ text-decoration:line-through; color:#9e9e9e; }}
@@ -206,105 +849,275 @@ def generate_html_report(results, date_str):
             .result-icon {{ background-color:#f1f3f4; border-radius:50%; width:28px; height:28px; display:flex; align-items:center; justify-content:center; margin-right:12px; overflow:hidden; flex-shrink:0; }}
             .result-site-name {{ font-size:14px; color:#202124; text-decoration:none; }}
             .result-url {{ font-size:12px; color:#4d5156; text-decoration:none; word-wrap: break-word; }}
+            .result-title {{ text-decoration:none; }}
             .result-title h3 {{ font-size:20px; color:#1a0dab; margin:0; font-weight:normal; display: inline; transition: color 0.25s; }}
             .result-title:hover h3 {{ text-decoration: underline; }}
             .result-snippet {{ font-size:14px; line-height:1.58; color:#4d5156; transition: color 0.25s; }}
+            .badge {{ color:#70757a; }}
             .highlight {{ color:#c5221f; font-weight:bold; }}
+            .result-alternates {{ font-size:12px; color:#70757a; margin-top:4px; }}
+            .result-alternates a {{ color:#4d5156; }}
+            .facts {{ margin-top:4px; }}
+            .fact {{ display:inline-block; font-size:12px; color:#4d5156; background:#f1f3f4; border-radius:10px; padding:1px 8px; margin:2px 4px 0 0; }}
+            .fact.cancelled {{ color:#fff; background:#c5221f; }}
             .index-badge {{ position:absolute; left:-35px; top:15px; font-size:14px; color:#70757a; font-weight:bold; }}
+            #sentinel {{ height:1px; }}
         </style>
     </head>
     <body>
         <div class="container">
             <h1>📄 ผลการค้นหาประจำวันที่ {date}</h1>
             <div class="meta">พบทั้งหมด {count} รายการ <span id="stats"></span></div>
-            <div id="results-list">{results_html}</div>
+            <div class="filters">
+                <input type="search" id="f-text" placeholder="ค้นหาในผลลัพธ์...">
+                <select id="f-found"><option value="">ทุกช่วงเวลา</option><option value="1d">ภายใน 24 ชม.</option><option value="7d">ภายใน 7 วัน</option><option value="1m">ภายใน 1 เดือน</option></select>
+                <select id="f-suffix"><option value="">ทุกโดเมน</option></select>
+                <select id="f-keyword"><option value="">ทุกคีย์เวิร์ด</option></select>
+                <select id="f-agency"><option value="">ทุกหน่วยงาน</option></select>
+                <select id="f-province"><option value="">ทุกจังหวัด</option></select>
+                <select id="f-category"><option value="">ทุกหมวดพัสดุ</option></select>
+                <label><input type="checkbox" id="f-unread"> เฉพาะที่ยังไม่อ่าน</label>
+            </div>
+            <div id="results-list"></div>
+            <div id="sentinel"></div>
         </div>
+        <script type="application/json" id="report-data">{{"k":{keywords},"r":{results_json}]}}</script>
         <script>
-            const STORAGE_KEY = 'viewedLinks_v2';
-            function getViewed() {{ return JSON.parse(localStorage.getItem(STORAGE_KEY)) || []; }}
-            function saveViewed(arr) {{ localStorage.setItem(STORAGE_KEY, JSON.stringify(arr)); }}
-            function updateStats() {{
-                const total = document.querySelectorAll('.result-item').length;
-                const read = document.querySelectorAll('.result-item.read').length;
-                document.getElementById('stats').innerText = ` — อ่านแล้ว ${{read}} / ${{total}}`;
+            const STORAGE_KEY = 'viewedLinks_v3';
+            const LEGACY_KEY = 'viewedLinks_v2';   // array ของ URL ที่รายงานเก่า (ไฟล์ที่ commit ไปแล้ว) ยังอ่าน/เขียนอยู่ — ห้ามเปลี่ยนรูปแบบ
+            const VIEWED_TTL_DAYS = 180;   // ลืมลิงก์ที่อ่านไปนานกว่านี้
+            const VIEWED_MAX = 20000;      // และเก็บไม่เกินจำนวนนี้ (เก็บรายการล่าสุด)
+            const CHUNK = 50;              // render ทีละกี่รายการเมื่อเลื่อนถึงท้ายหน้า
+            const FOUND_LABEL = {{'1d': '24 ชม.', '7d': '7 วัน', '1m': '1 เดือน'}};
+            const CATEGORY_LABEL = {{vehicle: 'ยานพาหนะ', building: 'อาคาร/สิ่งปลูกสร้าง', medical: 'ครุภัณฑ์การแพทย์', computer: 'คอมพิวเตอร์/สำนักงาน', scrap: 'เศษวัสดุ/ซาก'}};
+
+            const data = JSON.parse(document.getElementById('report-data').textContent);
+            const rows = data.r, keywords = data.k;
+            const today = Math.floor(Date.now() / 86400000);
+
+            // viewed: Map url -> วันที่อ่าน (นับเป็นวันตั้งแต่ epoch) — lookup O(1) แทน Array.includes
+            const viewed = new Map();
+            (function loadViewed() {{
+                const read = key => {{ try {{ return JSON.parse(localStorage.getItem(key)); }} catch (e) {{ return null; }} }};
+                const stored = read(STORAGE_KEY);
+                if (stored) {{
+                    for (const u in stored) if (today - stored[u] <= VIEWED_TTL_DAYS) viewed.set(u, stored[u]);
+                    return;
+                }}
+                // ครั้งแรก: ย้ายจาก v2 มาครั้งเดียว (v2 คงเดิมไว้ให้รายงานเก่า)
+                const legacy = read(LEGACY_KEY);
+                if (Array.isArray(legacy)) legacy.forEach(u => viewed.set(u, today));
+                if (viewed.size) localStorage.setItem(STORAGE_KEY, JSON.stringify(Object.fromEntries(viewed)));
+            }})();
+            let saveTimer = null;
+            function saveViewed() {{
+                clearTimeout(saveTimer);
+                saveTimer = setTimeout(() => {{
+                    let entries = [...viewed];
+                    if (entries.length > VIEWED_MAX) entries = entries.sort((a, b) => b[1] - a[1]).slice(0, VIEWED_MAX);
+                    localStorage.setItem(STORAGE_KEY, JSON.stringify(Object.fromEntries(entries)));
+                }}, 300);
+            }}
+
+            const listEl = document.getElementById('results-list');
+            const statsEl = document.getElementById('stats');
+            const fText = document.getElementById('f-text'), fFound = document.getElementById('f-found');
+            const fSuffix = document.getElementById('f-suffix'), fKeyword = document.getElementById('f-keyword');
+            const fUnread = document.getElementById('f-unread');
+            // select ของข้อมูลที่สกัดได้: [element, index ในแถว, ป้ายกำกับ]
+            const factFilters = [
+                [document.getElementById('f-agency'), 8, a => a],
+                [document.getElementById('f-province'), 9, p => p],
+                [document.getElementById('f-category'), 10, c => CATEGORY_LABEL[c] || c],
+            ];
+
+            function fillOptions(select, counts, label) {{
+                Object.entries(counts).sort((a, b) => b[1] - a[1]).forEach(([value, n]) => {{
+                    select.add(new Option(`${{label(value)}} (${{n}})`, value));
+                }});
+            }}
+            const suffixCounts = {{}}, keywordCounts = {{}};
+            rows.forEach(r => {{
+                suffixCounts[r[5]] = (suffixCounts[r[5]] || 0) + 1;
+                r[6].forEach(k => keywordCounts[k] = (keywordCounts[k] || 0) + 1);
+            }});
+            fillOptions(fSuffix, suffixCounts, s => s);
+            fillOptions(fKeyword, keywordCounts, k => keywords[k]);
+            factFilters.forEach(([select, col, label]) => {{
+                const counts = {{}};
+                rows.forEach(r => {{ if (r[col]) counts[r[col]] = (counts[r[col]] || 0) + 1; }});
+                fillOptions(select, counts, label);
+            }});
+
+            const escapeHtml = s => s.replace(/[&<>"']/g, c => ({{'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}}[c]));
+            function hostOf(url) {{ try {{ return new URL(url).host; }} catch (e) {{ return url; }} }}
+
+            function renderRow(i, n) {{
+                const [url, title, snippet, foundIn, foundAt, , , alternates, agency, province, category, announced, cancelled] = rows[i];
+                const u = escapeHtml(url), host = escapeHtml(hostOf(url));
+                const alt = alternates.length ? `<div class="result-alternates">ประกาศเดียวกันที่: ${{alternates.map(a =>
+                    `<a href="${{escapeHtml(a)}}" class="tracked-link" target="_blank">${{escapeHtml(hostOf(a))}}</a>`).join(', ')}}</div>` : '';
+                const facts = [cancelled ? '<span class="fact cancelled">ยกเลิกประกาศ</span>' : '']
+                    .concat([agency, province, CATEGORY_LABEL[category] || category, announced && `ประกาศ ${{announced}}`]
+                        .filter(Boolean).map(f => `<span class="fact">${{escapeHtml(f)}}</span>`)).join('');
+                return `<div class="result-item${{viewed.has(url) ? ' read' : ''}}" data-i="${{i}}">
+                    <div class="index-badge">${{n}}.</div>
+                    <button class="mark-read-btn">✓</button>
+                    <div class="result-top">
+                        <div class="result-icon"><img src="https://s2.googleusercontent.com/s2/favicons?domain=${{host}}&sz=32" width="16" loading="lazy"></div>
+                        <div class="result-site-info">
+                            <a href="${{u}}" class="result-site-name tracked-link" target="_blank">${{host}}</a><br>
+                            <a href="${{u}}" class="result-url tracked-link" target="_blank">${{escapeHtml(url.slice(0, 60))}}...</a>
+                        </div>
+                    </div>
+                    <a href="${{u}}" class="result-title tracked-link" target="_blank"><h3>${{title}}</h3></a>
+                    <div class="result-snippet"><span class="badge">(${{foundAt}}) ภายใน ${{FOUND_LABEL[foundIn] || foundIn}} — </span>${{snippet}}</div>
+                    ${{facts ? `<div class="facts">${{facts}}</div>` : ''}}
+                    ${{alt}}
+                </div>`;
+            }}
+
+            let visible = [], rendered = 0;
+            function renderMore() {{
+                if (rendered >= visible.length) return;
+                const end = Math.min(rendered + CHUNK, visible.length);
+                let html = '';
+                for (let n = rendered; n < end; n++) html += renderRow(visible[n], n + 1);
+                listEl.insertAdjacentHTML('beforeend', html);
+                rendered = end;
             }}
 
-            document.addEventListener('DOMContentLoaded', function() {{
-                const viewed = getViewed();
-                document.querySelectorAll('.result-item').forEach(it => {{
-                    const url = it.dataset.url;
-                    if (viewed.includes(url)) it.classList.add('read');
-
-                    it.querySelector('.mark-read-btn').onclick = (e) => {{
-                        e.stopPropagation();
-                        let v = getViewed();
-                        if (it.classList.toggle('read')) {{ if(!v.includes(url)) v.push(url); }}
-                        else {{ v = v.filter(u => u !== url); }}
-                        saveViewed(v);
-                        updateStats();
-                    }};
-
-                    it.querySelectorAll('.tracked-link').forEach(link => {{
-                        link.onclick = () => {{
-                            let v = getViewed();
-                            if(!v.includes(url)) {{ v.push(url); saveViewed(v); }}
-                            it.classList.add('read');
-                            updateStats();
-                        }};
-                    }});
+            const plain = html => html.replace(/<[^>]+>/g, '').toLowerCase();
+            function applyFilters() {{
+                const text = fText.value.trim().toLowerCase(), found = fFound.value, suffix = fSuffix.value;
+                const keyword = fKeyword.value === '' ? -1 : Number(fKeyword.value), unread = fUnread.checked;
+                visible = [];
+                rows.forEach((r, i) => {{
+                    if (found && r[3] !== found) return;
+                    if (suffix && r[5] !== suffix) return;
+                    if (keyword >= 0 && !r[6].includes(keyword)) return;
+                    if (factFilters.some(([select, col]) => select.value && r[col] !== select.value)) return;
+                    if (unread && viewed.has(r[0])) return;
+                    if (text && !(plain(r[1]) + ' ' + plain(r[2]) + ' ' + r[0].toLowerCase()).includes(text)) return;
+                    visible.push(i);
                 }});
+                listEl.innerHTML = '';
+                rendered = 0;
+                renderMore();
                 updateStats();
+            }}
+
+            function updateStats() {{
+                let read = 0;
+                rows.forEach(r => {{ if (viewed.has(r[0])) read++; }});
+                const shown = visible.length !== rows.length ? ` — แสดง ${{visible.length}} รายการ` : '';
+                statsEl.innerText = ` — อ่านแล้ว ${{read}} / ${{rows.length}}${{shown}}`;
+            }}
+
+            function markRead(item, read) {{
+                const url = rows[item.dataset.i][0];
+                if (read) viewed.set(url, today); else viewed.delete(url);
+                item.classList.toggle('read', read);
+                saveViewed();
+                updateStats();
+            }}
+
+            // event delegation: handler เดียวที่ list แทนการผูกทุก item
+            listEl.addEventListener('click', e => {{
+                const item = e.target.closest('.result-item');
+                if (!item) return;
+                if (e.target.closest('.mark-read-btn')) {{
+                    e.stopPropagation();
+                    markRead(item, !item.classList.contains('read'));
+                }} else if (e.target.closest('.tracked-link')) {{
+                    markRead(item, true);
+                }}
             }});
+
+            let debounce = null;
+            fText.addEventListener('input', () => {{ clearTimeout(debounce); debounce = setTimeout(applyFilters, 150); }});
+            [fFound, fSuffix, fKeyword, fUnread, ...factFilters.map(f => f[0])].forEach(el => el.addEventListener('change', applyFilters));
+
+            if ('IntersectionObserver' in window) {{
+                new IntersectionObserver(entries => {{ if (entries[0].isIntersecting) renderMore(); }}, {{rootMargin: '800px'}})
+                    .observe(document.getElementById('sentinel'));
+            }} else {{
+                window.addEventListener('scroll', () => {{
+                    if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 800) renderMore();
+                }});
+            }}
+            applyFilters();
         </script>
     </body>
     </html>
     """
 
-    results_html = ""
-    for idx, r in enumerate(results, 1):
-        title, snippet, url = highlight_text(r.get('title','')), highlight_text(r.get('snippet','')), r.get('link','#')
-        domain = urllib.parse.urlparse(url).netloc
-        favicon = f"https://s2.googleusercontent.com/s2/favicons?domain={domain}&sz=32"
-        f_in, f_at = r.get('_found_in','7d'), r.get('_found_at','N/A')
-        badge = f"({f_at}) ภายใน {'24 ชม.' if f_in=='1d' else ('7 วัน' if f_in=='7d' else '1 เดือน')}"
-
-        results_html += f"""
-        <div class="result-item" data-url="{escape(url)}">
-            <div class="index-badge">{idx}.</div>
-            <button class="mark-read-btn">✓</button>
-            <div class="result-top">
-                <div class="result-icon"><img src="{favicon}" width="16"></div>
-                <div class="result-site-info">
-                    <a href="{url}" class="result-site-name tracked-link" target="_blank">{domain}</a><br>
-                    <a href="{url}" class="result-url tracked-link" target="_blank">{url[:60]}...</a>
-                </div>
-            </div>
-            <a href="{url}" class="result-title tracked-link" style="text-decoration:none" target="_blank"><h3>{title}</h3></a>
-            <div class="result-snippet"><span style="color:#70757a">{badge} — </span>{snippet}</div>
-        </div>
-        """
-
     date_parts = date_str.split('_')
     display_date = f"{date_parts[0]}/{date_parts[1]}/{date_parts[2]}"
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(html_template.format(date=display_date, count=len(results), results_html=results_html))
+    # แยก template เป็นหัว/ท้าย แล้วเขียน JSON ทีละแถวลงไฟล์ทันที — ไม่ต้องสร้าง string ก้อนใหญ่ในหน่วยความจำ
+    # รายการคีย์เวิร์ดรู้ครบหลังวนทุกแถวแล้ว จึงวางไว้ท้ายก้อน JSON
+    head, tail = html_template.split('{{"k":{keywords},"r":{results_json}]}}')
+
+    keyword_index = {}
+    with atomic_write(filepath) as f:
+        f.write(head.format(date=display_date, count=len(hits)))
+        f.write('{"r":[')
+        for idx, hit in enumerate(hits):
+            if idx:
+                f.write(",\n")
+            f.write(_script_json(_report_row(hit, keyword_index)))
+        f.write('],"k":')
+        f.write(_script_json(list(keyword_index)))
+        f.write('}')
+        f.write(tail.format())
     return filepath
 
-def generate_index_html():
+def _report_date(date_str):
+    """'dd_mm_yyyy' -> 'yyyy-mm-dd' (ใช้เป็น key ของ manifest เพื่อให้เรียงตามวันที่จริงได้)"""
+    return datetime.strptime(date_str, "%d_%m_%Y").date().isoformat()
+
+def load_manifest():
+    """โหลด manifest ของรายงานทั้งหมด {yyyy-mm-dd: {file, count, size}}
+    ถ้ายังไม่มีไฟล์ จะสร้างจากไฟล์รายงานที่มีอยู่ครั้งเดียว (bootstrap) แล้วหลังจากนั้นอัปเดตทีละวัน"""
+    filepath = os.path.join(OUTPUT_DIR, MANIFEST_FILE)
+    if os.path.exists(filepath):
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f: return json.load(f)
+        except: pass
+
     import glob
-    files = sorted(glob.glob(os.path.join(OUTPUT_DIR, "result_*_daily.html")), reverse=True)
-    
-    links_list = []
-    for f in files:
-        match = re.search(r"(\d+_\d+_\d+)", f)
-        if match:
-            date_part = match.group(1).replace("_", "/")
-            links_list.append(f'<li><a href="{os.path.basename(f)}" class="report-link">📅 รายงานประจำวันที่ {date_part}</a></li>')
-    links = "".join(links_list)
-    
-    ict_now = get_ict_now()
-    updated_at = ict_now.strftime('%d/%m/%Y %H:%M')
-    
+    manifest = {}
+    for path in glob.glob(os.path.join(OUTPUT_DIR, "result_*_daily.html")):
+        match = re.search(r"result_(\d+_\d+_\d+)_daily\.html$", path)
+        if not match:
+            continue
+        date_str = match.group(1)
+        manifest[_report_date(date_str)] = {
+            "file": os.path.basename(path),
+            "count": len(load_daily_json(date_str)),
+            "size": os.path.getsize(path),
+        }
+    save_manifest(manifest)
+    return manifest
+
+def save_manifest(manifest):
+    with atomic_write(os.path.join(OUTPUT_DIR, MANIFEST_FILE)) as f:
+        json.dump(dict(sorted(manifest.items())), f, ensure_ascii=False, indent=2)
+
+def update_manifest(date_str, count, report_path):
+    manifest = load_manifest()
+    manifest[_report_date(date_str)] = {
+        "file": os.path.basename(report_path),
+        "count": count,
+        "size": os.path.getsize(report_path),
+    }
+    save_manifest(manifest)
+    return manifest
+
+def _index_page_name(month):
+    return f"index_{month.replace('-', '_')}.html"
+
+def _write_index_page(filepath, heading, links, month_nav, updated_at):
     html_template = f"""
     <!DOCTYPE html>
     <html lang="th">
@@ -320,12 +1133,17 @@ def generate_index_html():
             li {{ margin-bottom: 12px; }}
             .report-link {{ display: block; padding: 15px 20px; background-color: #ffffff; border: 1px solid #e1e8ed; border-radius: 8px; text-decoration: none; color: #34495e; font-weight: 500; transition: all 0.3s ease; }}
             .report-link:hover {{ background-color: #3498db; color: white; transform: translateY(-2px); box-shadow: 0 4px 8px rgba(0,0,0,0.1); }}
+            .report-meta {{ float: right; color: #95a5a6; font-size: 13px; font-weight: normal; }}
+            .month-nav {{ display: flex; flex-wrap: wrap; gap: 8px; margin-bottom: 25px; justify-content: center; }}
+            .month-nav a {{ padding: 6px 12px; border: 1px solid #e1e8ed; border-radius: 16px; text-decoration: none; color: #34495e; font-size: 14px; }}
+            .month-nav a.current {{ background-color: #3498db; border-color: #3498db; color: white; }}
             .footer {{ margin-top: 30px; color: #7f8c8d; font-size: 14px; text-align: center; }}
         </style>
     </head>
     <body>
         <div class="container">
-            <h1>📋 รายการรายงานการค้นหาทั้งหมด</h1>
+            <h1>{heading}</h1>
+            <div class="month-nav">{month_nav}</div>
             <ul>
                 {links}
             </ul>
@@ -334,87 +1152,845 @@ def generate_index_html():
     </body>
     </html>
     """
-    with open(os.path.join(OUTPUT_DIR, "index.html"), "w", encoding="utf-8") as f:
+    with atomic_write(filepath) as f:
         f.write(html_template)
 
+def generate_index_html(manifest=None, months=None):
+    """สร้าง index แยกรายเดือน (index_yyyy_mm.html) + หน้า index.html ที่แสดงเดือนล่าสุด
+    months = เดือน ('yyyy-mm') ที่ต้องเขียนหน้าใหม่ — None คือเขียนทุกเดือน (ใช้ตอน bootstrap)"""
+    if manifest is None:
+        manifest = load_manifest()
 
-def save_to_supabase(results: list) -> int:
-    """บันทึกผลลัพธ์ลง Supabase crawler_results — upsert on_conflict url"""
-    if not results:
-        return 0
+    by_month = {}
+    for day in sorted(manifest, reverse=True):
+        by_month.setdefault(day[:7], []).append(day)
+    if not by_month:
+        return
+    all_months = sorted(by_month, reverse=True)
+    latest = all_months[0]
+
+    updated_at = get_ict_now().strftime('%d/%m/%Y %H:%M')
+    pages = [(m, os.path.join(OUTPUT_DIR, _index_page_name(m))) for m in all_months if months is None or m in months]
+    pages.append((latest, os.path.join(OUTPUT_DIR, "index.html")))
+    for month, filepath in pages:
+        links_list = []
+        for day in by_month[month]:
+            entry = manifest[day]
+            y, m, d = day.split("-")
+            links_list.append(
+                f'<li><a href="{entry["file"]}" class="report-link">📅 รายงานประจำวันที่ {d}/{m}/{y}'
+                f'<span class="report-meta">{entry.get("count", 0)} รายการ · {entry.get("size", 0) // 1024} KB</span></a></li>'
+            )
+        month_nav = '<a href="search.html">🔎 ค้นหาทุกวัน</a>' + "".join(
+            f'<a href="{_index_page_name(m)}" class="{"current" if m == month else ""}">{m[5:7]}/{m[:4]}</a>'
+            for m in all_months
+        )
+        _write_index_page(filepath, f"📋 รายการรายงานการค้นหา เดือน {month[5:7]}/{month[:4]}",
+                          "".join(links_list), month_nav, updated_at)
+
+    # เดือนเก่าที่ยังไม่มีหน้า (เช่นเพิ่งย้ายมาใช้ manifest) ให้สร้างครั้งเดียว
+    if months is not None:
+        missing = [m for m in all_months if not os.path.exists(os.path.join(OUTPUT_DIR, _index_page_name(m)))]
+        if missing:
+            generate_index_html(manifest, months=set(missing))
+
+
+# ==========================================
+# CROSS-DAY SEARCH INDEX
+# ==========================================
+# inverted index แบบ character bigram (ภาษาไทยไม่มีช่องว่างระหว่างคำ จึงไม่ตัดคำ) แบ่งเป็น shard ตาม hash ของ term
+# ทุก term ใน shard เก็บ doc id แบบ delta — doc id เรียงตามวันที่ ข้อมูลวันเก่าจึงได้ id เดิมทุกครั้งที่ build ใหม่
+# normalize/tokenize/hash ต้องตรงกับ JavaScript ใน search.html
+_SEARCH_NORMALIZE_RE = re.compile(r"[^0-9a-z\u0e00-\u0e7f]+")
+
+def _search_normalize(text):
+    return _SEARCH_NORMALIZE_RE.sub(" ", text.lower()).strip()
+
+def _search_tokens(text):
+    tokens = set()
+    for word in _search_normalize(text).split():
+        if len(word) == 1:
+            tokens.add(word)
+        else:
+            tokens.update(word[i:i+2] for i in range(len(word) - 1))
+    return tokens
+
+def _term_shard(term):
+    # FNV-1a 32 bit บน code point (ตรงกับ Math.imul ใน JavaScript สำหรับตัวอักษรใน BMP)
+    h = 0x811C9DC5
+    for ch in term:
+        h = ((h ^ ord(ch)) * 0x01000193) & 0xFFFFFFFF
+    return h % SEARCH_TERM_SHARDS
+
+def _write_if_changed(filepath, content):
+    """เขียนไฟล์เฉพาะเมื่อเนื้อหาเปลี่ยน (shard ที่ไม่เปลี่ยนจะไม่โผล่ใน git diff)"""
     try:
-        from supabase import create_client
-        client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        today  = date.today().isoformat()
+        with open(filepath, "r", encoding="utf-8", newline="") as f:
+            if f.read() == content:
+                return False
+    except OSError:
+        pass
+    with atomic_write(filepath) as f:
+        f.write(content)
+    return True
 
-        payload = []
-        for r in results:
-            url    = r.get("link", "")
-            if not url:
+def _load_search_meta(out_dir):
+    """segment เดิม {yyyy-mm: ข้อมูล segment} จาก search/meta.json — ว่างถ้ายังไม่มีหรือค่าการแบ่ง shard เปลี่ยน"""
+    try:
+        with open(os.path.join(out_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if meta.get("term_shards") != SEARCH_TERM_SHARDS or meta.get("doc_shard_size") != SEARCH_DOC_SHARD_SIZE:
+        return {}
+    return {seg["month"]: seg for seg in meta.get("months", [])}
+
+def _search_url_key(url):
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+def _segment_urls(out_dir, seg):
+    """hash ของ URL ทั้งหมดใน segment (search/yyyy-mm/urls.txt) — อ่านแทน docs_*.json ที่มี title/snippet ทั้งหมด"""
+    with open(os.path.join(out_dir, seg["month"], "urls.txt"), "r", encoding="utf-8") as f:
+        return set(f.read().split())
+
+def _build_search_segment(seg_dir, month, indexed):
+    """สร้าง segment ของเดือนเดียว (doc id เริ่มที่ 0 ในแต่ละเดือน) — คืน (ข้อมูล segment, จำนวนไฟล์ที่เปลี่ยน)"""
+    os.makedirs(seg_dir, exist_ok=True)
+    postings = [{} for _ in range(SEARCH_TERM_SHARDS)]
+    docs, days = [], set()
+    keys = []
+    for day, r in iter_archive(f"{month}-01", f"{month}-31"):
+        url = r.get("link")
+        key = url and _search_url_key(url)
+        if not url or r.get("_dup_of") or key in indexed:
+            continue  # URL เดิมที่ถูกรายงานซ้ำหลายวัน เก็บเฉพาะวันแรกที่พบ
+        indexed.add(key)
+        keys.append(key)
+        doc_id = len(docs)
+        title, snippet = r.get("title", ""), r.get("snippet", "")
+        docs.append([day, url, title, snippet])
+        days.add(day)
+        for term in _search_tokens(f"{title} {snippet}"):
+            postings[_term_shard(term)].setdefault(term, []).append(doc_id)
+
+    changed = 0
+    for shard, terms in enumerate(postings):
+        encoded = {}
+        for term, ids in terms.items():
+            encoded[term] = [ids[0]] + [b - a for a, b in zip(ids, ids[1:])]
+        content = json.dumps(encoded, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+        changed += _write_if_changed(os.path.join(seg_dir, f"terms_{shard:02d}.json"), content)
+    written = set()
+    for start in range(0, len(docs), SEARCH_DOC_SHARD_SIZE):
+        name = f"docs_{start // SEARCH_DOC_SHARD_SIZE:04d}.json"
+        written.add(name)
+        content = json.dumps(docs[start:start+SEARCH_DOC_SHARD_SIZE], ensure_ascii=False, separators=(",", ":"))
+        changed += _write_if_changed(os.path.join(seg_dir, name), content)
+    changed += _write_if_changed(os.path.join(seg_dir, "urls.txt"), "".join(f"{key}\n" for key in sorted(keys)))
+    for name in os.listdir(seg_dir):
+        if name.startswith("docs_") and name not in written:
+            os.remove(os.path.join(seg_dir, name))
+            changed += 1
+    segment = {
+        "month": month,
+        "docs": len(docs),
+        "first_day": min(days) if days else None,
+        "last_day": max(days) if days else None,
+        "days": len(days),
+    }
+    return segment, changed
+
+def build_search_index(months=None):
+    """สร้างดัชนีค้นหาข้ามวัน + หน้า search.html แบ่งเป็น segment รายเดือน (search/yyyy-mm/terms_*.json, docs_*.json)
+    months = เดือนที่ archive เปลี่ยน (main ส่งเดือนของวันนี้): สร้างใหม่เฉพาะเดือนนั้นเป็นต้นไป segment ของเดือนก่อนหน้าไม่ถูกแตะ
+    ต้นทุนต่อรอบ = archive ของเดือนนั้น + urls.txt ของเดือนก่อนหน้า (16 ตัวอักษรต่อ URL ไม่ parse docs_*.json)
+    — ไม่ส่ง months (คำสั่ง build-search) = สร้างใหม่ทุกเดือน
+    คืน (จำนวนเอกสาร, จำนวนไฟล์ที่เปลี่ยน)"""
+    import shutil
+    started = time.perf_counter()
+    out_dir = os.path.join(OUTPUT_DIR, SEARCH_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+
+    archived = sorted({day[:7] for day in archive_days()})
+    old = _load_search_meta(out_dir) if months is not None else {}
+    rebuild = set(months or ()) | {month for month in archived if month not in old}
+    first = "" if months is None else min(rebuild, default="9999-99")
+
+    segments, indexed, changed = [], set(), 0
+    for month in archived:
+        if month < first:
+            # URL ที่ segment ก่อนหน้ามีแล้วจะไม่ถูกนับซ้ำในเดือนที่สร้างใหม่
+            segments.append(old[month])
+            indexed |= _segment_urls(out_dir, old[month])
+            continue
+        segment, n = _build_search_segment(os.path.join(out_dir, month), month, indexed)
+        segments.append(segment)
+        changed += n
+
+    # segment ของเดือนที่ไม่มีใน archive แล้ว
+    keep = {seg["month"] for seg in segments}
+    for name in os.listdir(out_dir):
+        path = os.path.join(out_dir, name)
+        if os.path.isdir(path) and name not in keep:
+            shutil.rmtree(path)
+            changed += 1
+
+    days = [seg for seg in segments if seg["days"]]
+    meta = {
+        "docs": sum(seg["docs"] for seg in segments),
+        "term_shards": SEARCH_TERM_SHARDS,
+        "doc_shard_size": SEARCH_DOC_SHARD_SIZE,
+        "first_day": days[0]["first_day"] if days else None,
+        "last_day": days[-1]["last_day"] if days else None,
+        "days": sum(seg["days"] for seg in segments),
+        "months": segments,
+    }
+    changed += _write_if_changed(os.path.join(out_dir, "meta.json"), json.dumps(meta, indent=2))
+    changed += _write_if_changed(os.path.join(OUTPUT_DIR, "search.html"), SEARCH_PAGE_HTML)
+    print(f"🔎 Search index: {meta['docs']:,} เอกสารจาก {meta['days']} วัน, "
+          f"สร้างใหม่ {len(segments) - sum(month < first for month in keep)}/{len(segments)} เดือน, "
+          f"เขียนใหม่ {changed} ไฟล์ ({time.perf_counter() - started:.1f}s)")
+    return meta["docs"], changed
+
+SEARCH_PAGE_HTML = """<!DOCTYPE html>
+<html lang="th">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>ค้นหารายงานย้อนหลัง</title>
+    <style>
+        body { font-family: Arial, sans-serif; background-color: #fff; margin:0; padding:20px 40px; color:#202124; }
+        .container { max-width: 652px; margin: 0; }
+        h1 { font-size:28px; font-weight:bold; border-bottom:3px solid #1a0dab; padding-bottom:10px; margin-bottom:20px; }
+        .search-box { display:flex; gap:8px; margin-bottom:10px; }
+        .search-box input[type=search] { flex:1; font-size:16px; padding:8px 10px; border:1px solid #dadce0; border-radius:6px; }
+        .search-box select { font-size:14px; border:1px solid #dadce0; border-radius:6px; }
+        .meta { font-size:14px; color:#70757a; margin-bottom:20px; border-bottom:1px solid #ebebeb; padding-bottom:12px; }
+        .facets { font-size:13px; color:#70757a; margin-bottom:20px; }
+        .facets a { color:#1a0dab; margin-right:8px; text-decoration:none; cursor:pointer; }
+        .result-item { margin-bottom:24px; }
+        .result-date { font-size:12px; color:#70757a; }
+        .result-url { font-size:12px; color:#4d5156; text-decoration:none; word-wrap:break-word; }
+        .result-title { text-decoration:none; }
+        .result-title h3 { font-size:18px; color:#1a0dab; margin:2px 0; font-weight:normal; }
+        .result-title:hover h3 { text-decoration:underline; }
+        .result-snippet { font-size:14px; line-height:1.58; color:#4d5156; }
+        .highlight { color:#c5221f; font-weight:bold; }
+        a.back { font-size:14px; color:#1a0dab; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>🔎 ค้นหารายงานย้อนหลัง</h1>
+        <div class="search-box">
+            <input type="search" id="q" placeholder="เช่น โรงพยาบาล เชียงใหม่ รถยนต์" autofocus>
+            <select id="month"><option value="">ทุกเดือน</option></select>
+        </div>
+        <div class="meta" id="meta">กำลังโหลดดัชนี...</div>
+        <div class="facets" id="facets"></div>
+        <div id="results"></div>
+        <a class="back" href="index.html">← กลับหน้ารายการรายงาน</a>
+    </div>
+    <script>
+        const DIR = 'search/';
+        const MAX_RESULTS = 200;
+        const cache = {};
+        let meta = null, lastQuery = 0;
+
+        const fetchJson = path => cache[path] || (cache[path] = fetch(DIR + path).then(r => r.json()));
+        const metaReady = fetchJson('meta.json').then(m => (meta = m));
+        const pad = (n, width) => String(n).padStart(width, '0');
+        const normalize = s => s.toLowerCase().replace(/[^0-9a-z\\u0e00-\\u0e7f]+/g, ' ').trim();
+        function tokens(words) {
+            const out = new Set();
+            words.forEach(w => {
+                if (w.length === 1) out.add(w);
+                else for (let i = 0; i < w.length - 1; i++) out.add(w.slice(i, i + 2));
+            });
+            return [...out];
+        }
+        function shardOf(term) {
+            let h = 0x811c9dc5;
+            for (const ch of term) h = Math.imul(h ^ ch.codePointAt(0), 0x01000193) >>> 0;
+            return h % meta.term_shards;
+        }
+        function decode(deltas) {
+            const ids = new Array(deltas.length);
+            let id = 0;
+            for (let i = 0; i < deltas.length; i++) ids[i] = id += deltas[i];
+            return ids;
+        }
+        function intersect(a, b) {
+            const out = [];
+            for (let i = 0, j = 0; i < a.length && j < b.length;) {
+                if (a[i] === b[j]) { out.push(a[i]); i++; j++; }
+                else if (a[i] < b[j]) i++; else j++;
+            }
+            return out;
+        }
+        const escapeHtml = s => s.replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c]));
+        function hostOf(url) { try { return new URL(url).host; } catch (e) { return url; } }
+        function highlight(text, words) {
+            let html = escapeHtml(text);
+            words.forEach(w => { html = html.split(escapeHtml(w)).join('\\u0000' + escapeHtml(w) + '\\u0001'); });
+            return html.replace(/\\u0000/g, "<span class='highlight'>").replace(/\\u0001/g, '</span>');
+        }
+
+        // เอกสารที่มีทุก bigram ใน segment ของเดือนเดียว (ใหม่สุดก่อน) — doc id เริ่มที่ 0 ในแต่ละเดือน
+        async function searchSegment(seg, terms) {
+            const lists = await Promise.all(terms.map(t => fetchJson(`${seg.month}/terms_${pad(shardOf(t), 2)}.json`).then(s => s[t] ? decode(s[t]) : [])));
+            const ids = (lists.sort((a, b) => a.length - b.length).reduce((acc, l) => acc === null ? l : intersect(acc, l), null) || []).reverse();
+            const shards = [...new Set(ids.map(id => Math.floor(id / meta.doc_shard_size)))];
+            const docs = {};
+            await Promise.all(shards.map(s => fetchJson(`${seg.month}/docs_${pad(s, 4)}.json`).then(rows => { docs[s] = rows; })));
+            return ids.map(id => docs[Math.floor(id / meta.doc_shard_size)][id % meta.doc_shard_size]);
+        }
+
+        async function search() {
+            const query = ++lastQuery;
+            await metaReady;   // shardOf ต้องใช้ meta.term_shards — พิมพ์ก่อนโหลดดัชนีเสร็จต้องรอ
+            const words = normalize(document.getElementById('q').value).split(' ').filter(Boolean);
+            const month = document.getElementById('month').value;
+            const results = document.getElementById('results'), facets = document.getElementById('facets');
+            if (!words.length) { results.innerHTML = facets.innerHTML = ''; showMeta(); return; }
+
+            const started = performance.now();
+            const terms = tokens(words);
+            const found = await Promise.all(meta.months.slice().reverse().map(seg => searchSegment(seg, terms)));
+            if (query !== lastQuery) return;
+
+            // bigram ครบไม่ได้แปลว่าคำเรียงติดกัน — ตรวจกับเอกสารจริงว่ามีทุกคำ
+            const matched = [], byMonth = {}, byDomain = {};
+            found.flat().forEach(doc => {
+                const text = normalize(doc[2] + ' ' + doc[3]);
+                if (!words.every(w => text.includes(w))) return;
+                byMonth[doc[0].slice(0, 7)] = (byMonth[doc[0].slice(0, 7)] || 0) + 1;
+                if (month && doc[0].slice(0, 7) !== month) return;
+                const host = hostOf(doc[1]);
+                byDomain[host] = (byDomain[host] || 0) + 1;
+                matched.push(doc);
+            });
+
+            const took = (performance.now() - started).toFixed(0);
+            document.getElementById('meta').innerText = `พบ ${matched.length.toLocaleString()} รายการ (${took} ms)` +
+                (matched.length > MAX_RESULTS ? ` — แสดง ${MAX_RESULTS} รายการล่าสุด` : '');
+            const topDomains = Object.entries(byDomain).sort((a, b) => b[1] - a[1]).slice(0, 8);
+            facets.innerHTML = (topDomains.length ? 'โดเมน: ' + topDomains.map(([d, n]) => `${escapeHtml(d)} (${n})`).join(' · ') : '') +
+                '<br>เดือน: ' + Object.entries(byMonth).sort().reverse().map(([m, n]) => `<a data-month="${m}">${m.slice(5)}/${m.slice(0, 4)} (${n})</a>`).join('');
+            results.innerHTML = matched.slice(0, MAX_RESULTS).map(([day, url, title, snippet]) => `
+                <div class="result-item">
+                    <div class="result-date">${day.split('-').reverse().join('/')} · ${escapeHtml(hostOf(url))}</div>
+                    <a href="${escapeHtml(url)}" class="result-title" target="_blank"><h3>${highlight(title, words)}</h3></a>
+                    <a href="${escapeHtml(url)}" class="result-url" target="_blank">${escapeHtml(url.slice(0, 80))}</a>
+                    <div class="result-snippet">${highlight(snippet, words)}</div>
+                </div>`).join('');
+        }
+
+        function showMeta() {
+            document.getElementById('meta').innerText =
+                `ดัชนี ${meta.docs.toLocaleString()} รายการจาก ${meta.days} วัน (${meta.first_day} ถึง ${meta.last_day})`;
+        }
+
+        metaReady.then(m => {
+            const select = document.getElementById('month');
+            if (m.first_day) {
+                for (let d = new Date(m.last_day.slice(0, 7) + '-01'); d >= new Date(m.first_day.slice(0, 7) + '-01'); d.setMonth(d.getMonth() - 1)) {
+                    const value = d.toISOString().slice(0, 7);
+                    select.add(new Option(`${value.slice(5)}/${value.slice(0, 4)}`, value));
+                }
+            }
+            showMeta();
+            const params = new URLSearchParams(location.search);
+            if (params.get('q')) { document.getElementById('q').value = params.get('q'); search(); }
+        });
+
+        let debounce = null;
+        document.getElementById('q').addEventListener('input', () => { clearTimeout(debounce); debounce = setTimeout(search, 200); });
+        document.getElementById('month').addEventListener('change', search);
+        document.getElementById('facets').addEventListener('click', e => {
+            if (e.target.dataset.month) { document.getElementById('month').value = e.target.dataset.month; search(); }
+        });
+    </script>
+</body>
+</html>
+"""
+
+
+# ==========================================
+# CROSS-DAY URL INDEX
+# ==========================================
+
+# ตารางที่ dump ลง state/ : (ตาราง, คอลัมน์, ORDER BY) — lsh_buckets สร้างใหม่จาก near_dup_docs ได้จึงไม่ต้องเก็บ
+_STATE_TABLES = (
+    ("seen_urls", "url, first_seen, last_seen, hits", "url"),
+    ("query_stats", "query, tbs, last_run, runs, yield_ewma", "query, tbs"),
+    ("supabase_sync", "url, row_hash, synced_at", "url"),
+    ("domain_stats", "domain, first_seen, last_seen, hits, valid_hits, paths, pushed_index_url", "domain"),
+    ("near_dup_docs", "url, day, canonical, sig", "url"),
+)
+
+def open_state_db():
+    """เปิดสถานะข้ามวันเป็น SQLite ใน memory แล้วโหลดจาก state/*.ndjson
+    ครั้งแรกจะ seed ดัชนี URL จาก search_history.json และ result_*.json เดิม — ต้องปิดด้วย close_state_db เพื่อบันทึกกลับ"""
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS seen_urls (
+            url        TEXT PRIMARY KEY,
+            first_seen TEXT NOT NULL,
+            last_seen  TEXT NOT NULL,
+            hits       INTEGER NOT NULL DEFAULT 1
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS query_stats (
+            query      TEXT NOT NULL,
+            tbs        TEXT NOT NULL,
+            last_run   TEXT NOT NULL,
+            runs       INTEGER NOT NULL DEFAULT 0,
+            yield_ewma REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (query, tbs)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS supabase_sync (
+            url       TEXT PRIMARY KEY,
+            row_hash  TEXT NOT NULL,
+            synced_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS domain_stats (
+            domain           TEXT PRIMARY KEY,
+            first_seen       TEXT NOT NULL,
+            last_seen        TEXT NOT NULL,
+            hits             INTEGER NOT NULL DEFAULT 0,
+            valid_hits       INTEGER NOT NULL DEFAULT 0,
+            paths            TEXT NOT NULL DEFAULT '{}',
+            pushed_index_url TEXT
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS near_dup_docs (
+            id        INTEGER PRIMARY KEY,
+            url       TEXT NOT NULL UNIQUE,
+            day       TEXT NOT NULL,
+            canonical TEXT NOT NULL,
+            sig       BLOB NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS lsh_buckets (
+            band_key INTEGER NOT NULL,
+            doc_id   INTEGER NOT NULL,
+            PRIMARY KEY (band_key, doc_id)
+        ) WITHOUT ROWID
+    """)
+    _restore_state(conn)
+    if conn.execute("SELECT 1 FROM seen_urls LIMIT 1").fetchone() is None:
+        _seed_seen_urls(conn)
+    return conn
+
+def _state_path(table):
+    return os.path.join(OUTPUT_DIR, STATE_DIR, f"{table}.ndjson")
+
+def _restore_state(conn):
+    with conn:
+        for table, columns, _ in _STATE_TABLES:
+            if not os.path.exists(_state_path(table)):
                 continue
-            domain = urllib.parse.urlparse(url).netloc
-            kw_hit = next(
-                (kw for kw in HIGHLIGHT_WORDS if kw in r.get("snippet", "") or kw in r.get("title", "")),
-                "ขายทอดตลาด"
-            )
-            payload.append({
-                "url":         url,
-                "domain":      domain,
-                "title":       r.get("title", "")[:200],
-                "snippet":     r.get("snippet", "")[:500],
-                "keyword_hit": kw_hit,
-                "url_pattern": "",
-                "found_date":  today,
-                "source":      "serper_daily",
-                "status":      "unread",
-            })
+            with open(_state_path(table), "r", encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+            if table == "near_dup_docs":
+                rows = [(url, day, canonical, base64.b64decode(sig)) for url, day, canonical, sig in rows]
+            placeholders = ",".join("?" * (columns.count(",") + 1))
+            conn.executemany(f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({placeholders})", rows)
+        conn.executemany(
+            "INSERT OR IGNORE INTO lsh_buckets (band_key, doc_id) VALUES (?, ?)",
+            ((key, doc_id) for doc_id, sig in conn.execute("SELECT id, sig FROM near_dup_docs WHERE canonical = url").fetchall()
+             for key in _band_keys(array("I", sig)))
+        )
 
-        saved = 0
-        for i in range(0, len(payload), 50):
-            batch = payload[i:i+50]
-            seen  = {}
-            for row in batch:
-                seen[row["url"]] = row
-            client.table("crawler_results") \
-                .upsert(list(seen.values()), on_conflict="url") \
-                .execute()
-            saved += len(seen)
+def close_state_db(conn):
+    """dump ทุกตารางเป็น state/<table>.ndjson (1 แถวต่อบรรทัด เรียงตาม key) แล้วปิด
+    แถวที่ไม่เปลี่ยนคือบรรทัดเดิม git จึงเก็บแค่ส่วนต่าง — ถ้า commit ไฟล์ SQLite จะเป็น blob ใหม่ทั้งไฟล์ทุก commit (repo โตเร็ว)
+    คืนจำนวนไฟล์ที่เปลี่ยน"""
+    os.makedirs(os.path.join(OUTPUT_DIR, STATE_DIR), exist_ok=True)
+    changed = 0
+    for table, columns, order in _STATE_TABLES:
+        lines = []
+        for row in conn.execute(f"SELECT {columns} FROM {table} ORDER BY {order}"):
+            row = [base64.b64encode(v).decode("ascii") if isinstance(v, bytes) else v for v in row]
+            lines.append(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+        changed += _write_if_changed(_state_path(table), "".join(lines))
+    conn.close()
+    return changed
 
-        print(f"✅ Supabase: บันทึก {saved} records ลง crawler_results")
-        return saved
+def _seed_seen_urls(conn):
+    first_seen = {}
+    history_file = os.path.join(OUTPUT_DIR, "search_history.json")
+    if os.path.exists(history_file):
+        try:
+            with open(history_file, 'r', encoding='utf-8') as f:
+                for key, day in json.load(f).items():
+                    url = key.split("|", 1)[0]  # key ของ search_history.json คือ "url|title"
+                    if url and (url not in first_seen or day < first_seen[url]):
+                        first_seen[url] = day
+        except: pass
+
+    for day, date_str in archive_days().items():
+        for url in load_daily_json(date_str):
+            if url not in first_seen or day < first_seen[url]:
+                first_seen[url] = day
+
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO seen_urls (url, first_seen, last_seen, hits) VALUES (?, ?, ?, 1)",
+            ((url, day, day) for url, day in first_seen.items())
+        )
+    if first_seen:
+        print(f"🗂️ URL index: seed {len(first_seen)} URLs จากข้อมูลเดิม")
+
+def lookup_seen_urls(conn, urls):
+    """คืน {url: (first_seen, last_seen, hits)} เฉพาะ URL ที่เคยพบแล้ว (ค้นผ่าน primary key ทีละชุด)"""
+    urls = list(urls)
+    found = {}
+    for i in range(0, len(urls), 500):
+        chunk = urls[i:i+500]
+        rows = conn.execute(
+            f"SELECT url, first_seen, last_seen, hits FROM seen_urls WHERE url IN ({','.join('?' * len(chunk))})",
+            chunk
+        )
+        for url, first, last, hits in rows:
+            found[url] = (first, last, hits)
+    return found
+
+def record_seen_urls(conn, urls, day):
+    """อัปเดต last_seen และนับจำนวน "วัน" ที่พบ (รันหลายรอบในวันเดียวกันนับครั้งเดียว)"""
+    with conn:
+        conn.executemany("""
+            INSERT INTO seen_urls (url, first_seen, last_seen, hits) VALUES (?, ?, ?, 1)
+            ON CONFLICT(url) DO UPDATE SET
+                hits = hits + (last_seen <> excluded.last_seen),
+                last_seen = excluded.last_seen
+        """, ((url, day, day) for url in urls))
+
+# ==========================================
+# QUERY SCHEDULER
+# ==========================================
+
+def _query_ttl_hours(tbs, runs, yield_ewma):
+    if runs >= LOW_YIELD_MIN_RUNS and yield_ewma < LOW_YIELD_THRESHOLD:
+        return LOW_YIELD_TTL_HOURS.get(tbs, 0)
+    return QUERY_TTL_HOURS.get(tbs, 0)
+
+def plan_jobs(conn, jobs, now):
+    """แยก jobs เป็น (ต้องยิง, ข้ามได้) ตาม TTL และ yield ที่เรียนรู้จากรอบก่อนๆ
+    qdr:w / qdr:m ที่ TTL 24 ชม. จะนับเป็นรายวัน (ยิงรอบแรกของวันเสมอ)"""
+    stats = {(q, tbs): (last_run, runs, ewma)
+             for q, tbs, last_run, runs, ewma in conn.execute("SELECT query, tbs, last_run, runs, yield_ewma FROM query_stats")}
+    to_run, skipped = [], []
+    for job in jobs:
+        _, raw_q, tbs = job
+        st = stats.get((raw_q, tbs))
+        if FORCE_ALL_QUERIES or st is None:
+            to_run.append(job)
+            continue
+        last_run = datetime.fromisoformat(st[0])
+        ttl = _query_ttl_hours(tbs, st[1], st[2])
+        if ttl >= 24:
+            fresh = (now.date() - last_run.date()).days < ttl // 24
+        else:
+            fresh = now - last_run < timedelta(hours=ttl)
+        (skipped if fresh else to_run).append(job)
+    return to_run, skipped
+
+def deep_candidates(conn, jobs):
+    """(query, tbs) ที่ควรไล่หลายหน้า: yield_ewma สูง หรือยังไม่เคยมีสถิติ"""
+    if SERPER_DEEP_PAGES <= 0:
+        return set()
+    stats = {(q, tbs): ewma for q, tbs, ewma in conn.execute("SELECT query, tbs, yield_ewma FROM query_stats")}
+    return {(raw_q, tbs) for _, raw_q, tbs in jobs if stats.get((raw_q, tbs), DEEP_MIN_YIELD) >= DEEP_MIN_YIELD}
+
+def record_query_yield(conn, job_yields, now):
+    """job_yields = {(query, tbs): จำนวน URL ใหม่ที่ผ่านการกรอง} ของ call ที่ยิงในรอบนี้"""
+    with conn:
+        conn.executemany("""
+            INSERT INTO query_stats (query, tbs, last_run, runs, yield_ewma) VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT(query, tbs) DO UPDATE SET
+                last_run = excluded.last_run,
+                runs = runs + 1,
+                yield_ewma = yield_ewma + ? * (excluded.yield_ewma - yield_ewma)
+        """, ((q, tbs, now.isoformat(timespec="minutes"), n, YIELD_EWMA_ALPHA) for (q, tbs), n in job_yields.items()))
+
+def build_supabase_payload(hits: list, today: str) -> list:
+    """แปลง Hit เป็นแถวของตาราง crawler_results (URL ซ้ำใช้แถวหลังสุด)"""
+    payload = {}
+    for hit in hits:
+        url = hit.url
+        if not url:
+            continue
+        payload[url] = {
+            "url":         url,
+            "domain":      hit.domain,
+            "title":       hit.title[:200],
+            "snippet":     hit.snippet[:500],
+            "keyword_hit": hit.keyword or "ขายทอดตลาด",
+            "url_pattern": "",
+            "found_date":  today,
+            "source":      "serper_daily",
+            "status":      "unread",
+        }
+    return list(payload.values())
+
+def _row_hash(row):
+    # ไม่รวม found_date/status — ไม่อย่างนั้นทุกแถวจะ "เปลี่ยน" ทุกวัน (สองคอลัมน์นี้ส่งเฉพาะตอน insert ครั้งแรก ดู save_to_supabase)
+    content = [row["url"], row["domain"], row["title"], row["snippet"], row["keyword_hit"], row["url_pattern"], row["source"]]
+    return hashlib.sha1(json.dumps(content, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+def _byte_batches(rows, max_bytes=SUPABASE_BATCH_BYTES, max_rows=SUPABASE_BATCH_ROWS):
+    """แบ่ง batch ตามขนาด payload จริง (bytes) แทนจำนวนแถวคงที่ — snippet ไทยยาวสั้นต่างกันมาก"""
+    batch, size = [], 2
+    for row in rows:
+        row_size = len(json.dumps(row, ensure_ascii=False).encode("utf-8")) + 1
+        if batch and (size + row_size > max_bytes or len(batch) >= max_rows):
+            yield batch
+            batch, size = [], 2
+        batch.append(row)
+        size += row_size
+    if batch:
+        yield batch
+
+def _synced_hashes(conn, urls):
+    urls = list(urls)
+    found = {}
+    for i in range(0, len(urls), 500):
+        chunk = urls[i:i+500]
+        found.update(conn.execute(
+            f"SELECT url, row_hash FROM supabase_sync WHERE url IN ({','.join('?' * len(chunk))})", chunk
+        ))
+    return found
+
+def save_to_supabase(hits: list, state_db=None) -> int:
+    """บันทึกผลลัพธ์ลง Supabase crawler_results — upsert on_conflict url
+    ถ้าส่ง state_db มา จะส่งเฉพาะแถวที่ใหม่หรือเนื้อหาเปลี่ยน (เทียบ hash กับรอบที่ sync สำเร็จครั้งก่อน)
+    แถวที่เคย sync แล้วจะไม่ส่ง status/found_date — merge-duplicates อัปเดตเฉพาะคอลัมน์ที่ส่ง สถานะที่ผู้ใช้ตั้งไว้จึงไม่ถูกทับ"""
+    if not hits:
+        return 0
+    try:
+        rows = build_supabase_payload(hits, date.today().isoformat())
+        hashes = {row["url"]: _row_hash(row) for row in rows}
+        unchanged = 0
+        if state_db is not None:
+            synced = _synced_hashes(state_db, hashes)
+            pending = [row for row in rows if synced.get(row["url"]) != hashes[row["url"]]]
+            unchanged = len(rows) - len(pending)
+            rows = [row if row["url"] not in synced else
+                    {k: v for k, v in row.items() if k not in ("status", "found_date")} for row in pending]
+        if not rows:
+            print(f"ℹ️ Supabase: ไม่มีแถวใหม่หรือเปลี่ยนแปลง (ข้าม {unchanged} แถว)")
+            return 0
+
+        # PostgREST ต้องการให้ทุกแถวใน request เดียวมี key ชุดเดียวกัน — แยก batch ของแถวใหม่กับแถวที่อัปเดต
+        batches = list(_byte_batches([row for row in rows if "status" in row]))
+        batches += _byte_batches([row for row in rows if "status" not in row])
+        done, failed = [], 0
+        with ThreadPoolExecutor(max_workers=max(1, SUPABASE_WORKERS)) as executor:
+            futures = {executor.submit(supabase_upsert, "crawler_results", batch, on_conflict="url"): batch for batch in batches}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done.extend(futures[future])
+                except Exception as e:
+                    failed += len(futures[future])
+                    print(f"❌ Supabase batch error: {e}")
+
+        # sink ไม่ใช่ Supabase จริง — ห้าม mark ว่า sync แล้ว ไม่อย่างนั้นรอบจริงจะไม่ส่งแถวเหล่านี้อีก
+        if state_db is not None and done and not SUPABASE_SINK:
+            synced_at = get_ict_now().isoformat(timespec="minutes")
+            with state_db:
+                state_db.executemany(
+                    "INSERT OR REPLACE INTO supabase_sync (url, row_hash, synced_at) VALUES (?, ?, ?)",
+                    ((row["url"], hashes[row["url"]], synced_at) for row in done)
+                )
+
+        print(f"✅ Supabase: บันทึก {len(done)} records ลง crawler_results ({len(batches)} batches, "
+              f"ข้าม {unchanged} แถวที่ไม่เปลี่ยน{f', ล้มเหลว {failed}' if failed else ''})")
+        return len(done)
 
     except Exception as e:
         print(f"❌ Supabase save error: {e}")
         return 0
 
 
-def add_new_domains(results: list) -> int:
-    """เพิ่ม domain ใหม่จาก Serper เข้า crawler_domains_normal เฉพาะ .go.th .ac.th .or.th"""
-    if not results:
-        return 0
-    try:
-        from supabase import create_client
-        client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# ==========================================
+# NEAR-DUPLICATE CLUSTERING
+# ==========================================
+_NORMALIZE_RE = re.compile(r"[\W_]+")
+_TIME_AGO_RE = re.compile(r"^\s*\d+\s*(?:วัน|ชั่วโมง|นาที|สัปดาห์)ที่ผ่านมา\s*[—-]?\s*")
+_EMPTY_BIN = 0xFFFFFFFF
 
-        payload = []
-        seen_domains = set()
-        for r in results:
-            url    = r.get("link", "")
-            parsed = urllib.parse.urlparse(url)
-            domain = parsed.netloc
+def _minhash(r):
+    """signature แบบ one-permutation MinHash: hash แต่ละ 5-gram ครั้งเดียวแล้วเก็บค่าต่ำสุดต่อ bin
+    (เร็วกว่า MinHash แบบ k permutations ราว 10 เท่า) — bin ว่างยืมค่าจาก bin ถัดไป (densification)"""
+    text = _NORMALIZE_RE.sub("", f"{r.get('title','')} {_TIME_AGO_RE.sub('', r.get('snippet',''))}".lower())
+    mins = [_EMPTY_BIN] * MINHASH_BINS
+    for i in range(max(1, len(text) - SHINGLE_SIZE + 1)):
+        h = (zlib.crc32(text[i:i+SHINGLE_SIZE].encode("utf-8")) * 2654435761) & 0xFFFFFFFF
+        b = (h * MINHASH_BINS) >> 32  # เลือก bin จากบิตบน — บิตล่างสุดถูก mask ทิ้งด้านล่าง ถ้าใช้ h % bins จะได้แต่ bin คู่
+        h &= 0xFFFFFFFE               # ค่าใน bin เป็นเลขคู่เสมอ จึงไม่ชนกับ _EMPTY_BIN
+        if h < mins[b]:
+            mins[b] = h
+    if _EMPTY_BIN in mins and len(set(mins)) > 1:
+        for b in range(MINHASH_BINS):
+            j = b
+            while mins[j % MINHASH_BINS] == _EMPTY_BIN:
+                j += 1
+            if j != b:
+                mins[b] = (mins[j % MINHASH_BINS] + j - b) & 0xFFFFFFFE
+    return array("I", mins)
+
+def _band_keys(sig):
+    rows = MINHASH_BINS // LSH_BANDS
+    return [(band << 32) | zlib.crc32(sig[band*rows:(band+1)*rows].tobytes()) for band in range(LSH_BANDS)]
+
+def _similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / MINHASH_BINS
+
+def cluster_near_duplicates(conn, results, today):
+    """จัดกลุ่มประกาศเดียวกันที่มาจากหลาย URL (mirror บน facebook, http/https, locale ต่างกัน ฯลฯ)
+    ค้นคู่ที่น่าจะซ้ำผ่าน LSH bucket ใน state DB (ย้อนหลัง NEAR_DUP_WINDOW_DAYS วัน) — ไม่ต้องเทียบทุกคู่
+    แถวที่ซ้ำจะได้ _dup_of = URL ตัวแทนกลุ่ม และตัวแทนที่อยู่ในผลวันนี้จะได้ _alternates = [URL อื่นในกลุ่ม]
+    คืนจำนวนแถวที่ถูกจัดเป็นตัวซ้ำ"""
+    cutoff = (date.fromisoformat(today) - timedelta(days=NEAR_DUP_WINDOW_DAYS)).isoformat()
+    by_url = {r['link']: r for r in results if r.get('link')}
+    for r in by_url.values():
+        r.pop('_dup_of', None)
+        r.pop('_alternates', None)
+
+    with conn:
+        conn.execute("DELETE FROM lsh_buckets WHERE doc_id IN (SELECT id FROM near_dup_docs WHERE day < ?)", (cutoff,))
+        conn.execute("DELETE FROM near_dup_docs WHERE day < ?", (cutoff,))
+
+        known = {}
+        urls = list(by_url)
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i+500]
+            known.update(conn.execute(
+                f"SELECT url, canonical FROM near_dup_docs WHERE url IN ({','.join('?' * len(chunk))})", chunk
+            ))
+
+        duplicates = 0
+        for url, r in by_url.items():
+            canonical = known.get(url)
+            if canonical is None:
+                sig = _minhash(r)
+                keys = _band_keys(sig)
+                best = None
+                rows = conn.execute(f"""
+                    SELECT url, canonical, sig FROM near_dup_docs WHERE id IN (
+                        SELECT doc_id FROM lsh_buckets WHERE band_key IN ({','.join('?' * len(keys))}))
+                """, keys)
+                for other_url, other_canonical, other_sig in rows:
+                    sim = _similarity(sig, array("I", other_sig))
+                    if sim >= NEAR_DUP_THRESHOLD and (best is None or sim > best[0]):
+                        best = (sim, other_canonical)
+                canonical = best[1] if best else url
+                doc_id = conn.execute(
+                    "INSERT INTO near_dup_docs (url, day, canonical, sig) VALUES (?, ?, ?, ?)",
+                    (url, today, canonical, sig.tobytes())
+                ).lastrowid
+                # bucket เก็บเฉพาะตัวแทนกลุ่ม: ตัวซ้ำที่เข้ากลุ่มแล้วไม่ต้องเป็น candidate อีก
+                # (ไม่อย่างนั้นประกาศที่ถูก mirror n ครั้งจะทำให้ต้องเทียบ O(n²) คู่)
+                if canonical == url:
+                    conn.executemany("INSERT OR IGNORE INTO lsh_buckets (band_key, doc_id) VALUES (?, ?)",
+                                     ((key, doc_id) for key in keys))
+
+            if canonical != url:
+                duplicates += 1
+                r['_dup_of'] = canonical
+                if canonical in by_url:
+                    by_url[canonical].setdefault('_alternates', []).append(url)
+    return duplicates
+
+# ==========================================
+# DOMAIN POOL
+# ==========================================
+
+def _index_url(parsed):
+    # ตัด URL ให้เป็น parent directory
+    parts      = parsed.path.rstrip("/").rsplit("/", 1)
+    parent_path = (parts[0] + "/") if len(parts) > 1 else "/"
+    return f"{parsed.scheme}://{parsed.netloc}{parent_path}"
 
-            if not domain or domain in seen_domains:
+def _load_domain_stats(conn, domains):
+    domains = list(domains)
+    stats = {}
+    for i in range(0, len(domains), 500):
+        chunk = domains[i:i+500]
+        rows = conn.execute(
+            f"SELECT domain, first_seen, last_seen, hits, valid_hits, paths, pushed_index_url "
+            f"FROM domain_stats WHERE domain IN ({','.join('?' * len(chunk))})", chunk
+        )
+        for domain, first, last, hits, valid_hits, paths, pushed in rows:
+            stats[domain] = [first, last, hits, valid_hits, Counter(json.loads(paths)), pushed]
+    return stats
+
+def update_domain_stats(conn, batches, today, counted_today=()):
+    """สะสมสถิติต่อ domain (.go.th .ac.th .or.th) จากผลดิบทุก batch ของรอบนี้:
+    จำนวน hit, hit ที่ผ่านการกรอง และ parent path ที่พบบ่อย (นับเฉพาะ hit ที่ valid)
+    counted_today = URL ที่รอบก่อนหน้าของวันนี้นับไปแล้ว (cron รันหลายรอบต่อวัน qdr:d จะคืน URL เดิมซ้ำทุกรอบ)"""
+    run_stats = {}
+    counted = set(counted_today)
+    for batch in batches:
+        for r in batch:
+            url = r.get('link')
+            if not url or url in counted:
                 continue
-            if not any(domain.endswith(s) for s in ALLOWED_SUFFIXES):
+            counted.add(url)
+            parsed = urllib.parse.urlparse(url)
+            if not parsed.netloc.endswith(ALLOWED_SUFFIXES):
                 continue
+            st = run_stats.setdefault(parsed.netloc, [0, 0, Counter()])
+            st[0] += 1
+            if is_valid_result(url, r.get('title',''), r.get('snippet','')):
+                st[1] += 1
+                st[2][_index_url(parsed)] += 1
+    if not run_stats:
+        return
 
-            seen_domains.add(domain)
+    stats = _load_domain_stats(conn, run_stats)
+    rows = []
+    for domain, (hits, valid_hits, paths) in run_stats.items():
+        first, _, old_hits, old_valid, old_paths, pushed = stats.get(domain, [today, today, 0, 0, Counter(), None])
+        merged = old_paths + paths
+        rows.append((domain, first, today, old_hits + hits, old_valid + valid_hits,
+                     json.dumps(dict(merged.most_common(DOMAIN_TOP_PATHS)), ensure_ascii=False), pushed))
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO domain_stats VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
 
-            # ตัด URL ให้เป็น parent directory
-            parts      = parsed.path.rstrip("/").rsplit("/", 1)
-            parent_path = (parts[0] + "/") if len(parts) > 1 else "/"
-            index_url  = f"{parsed.scheme}://{parsed.netloc}{parent_path}"
+def add_new_domains(hits: list, state_db=None) -> int:
+    """เพิ่ม domain ใหม่จาก Serper เข้า crawler_domains_normal เฉพาะ .go.th .ac.th .or.th
+    ถ้าส่ง state_db มา index_url จะเป็น parent path ที่พบบ่อยที่สุดของ domain (จาก domain_stats)
+    และจะ upsert เฉพาะ domain ใหม่หรือที่ index_url เปลี่ยนจากที่เคยส่งไป"""
+    if not hits:
+        return 0
+    try:
+        candidates = {}
+        for hit in hits:
+            if hit.domain and hit.domain not in candidates and hit.domain.endswith(ALLOWED_SUFFIXES):
+                candidates[hit.domain] = hit.index_url
 
+        stats = _load_domain_stats(state_db, candidates) if state_db is not None else {}
+        payload = []
+        for domain, index_url in candidates.items():
+            st = stats.get(domain)
+            if st is not None:
+                paths, pushed = st[4], st[5]
+                if paths:
+                    index_url = paths.most_common(1)[0][0]
+                # เปลี่ยน index_url เมื่อ path ใหม่พบบ่อยกว่าที่เคยส่งไปจริงๆ เท่านั้น (กันสลับไปมาตอนคะแนนเท่ากัน)
+                if pushed is not None and (pushed == index_url or paths.get(pushed, 0) >= paths.get(index_url, 0)):
+                    continue
             payload.append({
                 "domain":    domain,
                 "index_url": index_url,
@@ -424,54 +2000,431 @@ def add_new_domains(results: list) -> int:
             print("ℹ️ ไม่มี domain ใหม่จาก Serper")
             return 0
 
-        client.table("crawler_domains_normal") \
-            .upsert(payload, on_conflict="domain") \
-            .execute()
+        supabase_upsert("crawler_domains_normal", payload, on_conflict="domain")
 
-        print(f"✅ Domain pool: เพิ่ม/อัปเดต {len(payload)} domains")
+        if state_db is not None and not SUPABASE_SINK:
+            with state_db:
+                state_db.executemany(
+                    "UPDATE domain_stats SET pushed_index_url = ? WHERE domain = ?",
+                    ((row["index_url"], row["domain"]) for row in payload)
+                )
+
+        print(f"✅ Domain pool: เพิ่ม/อัปเดต {len(payload)} domains (ไม่เปลี่ยน {len(candidates) - len(payload)})")
         return len(payload)
 
     except Exception as e:
         print(f"❌ Domain upsert error: {e}")
         return 0
 
+# ==========================================
+# REPLAY (re-filter archive ด้วยกฎปัจจุบัน)
+# ==========================================
+
+def _replay_day(task):
+    """worker (แยก process): โหลดข้อมูลหนึ่งวัน กรองด้วยกฎปัจจุบัน แล้วคืนเฉพาะส่วนต่างกับคำตัดสินเดิม
+    คืน (วัน, จำนวนแถวที่ตรวจ, [(url, title, เหตุผลที่ตัด)], [(url, title, เหตุผลเดิมที่เคยถูกตัด)])"""
+    global OUTPUT_DIR
+    OUTPUT_DIR, day, date_str = task
+    checked, dropped, added = 0, [], []
+    # แถวใน archive หลัก = เคยผ่านการกรอง
+    for r in iter_day(date_str):
+        checked += 1
+        valid, reason = result_verdict(r.get('link',''), r.get('title',''), r.get('snippet',''))
+        if not valid:
+            dropped.append((r.get('link',''), r.get('title',''), reason))
+    # แถวใน .rejected = เคยถูกกรองออก
+    for r in iter_day_rejected(date_str):
+        checked += 1
+        if is_valid_result(r.get('link',''), r.get('title',''), r.get('snippet','')):
+            added.append((r.get('link',''), r.get('title',''), r.get('_reject','')))
+    return day, checked, dropped, added
+
+def replay(start=None, end=None, workers=None, show=5):
+    """รันคำกรอง (negative_* / highlight_words ใน search_config.json) ชุดปัจจุบันกับข้อมูลทุกวันใน archive แล้วรายงานว่า URL ไหนจะถูกตัดออก/เพิ่มเข้า
+    กระจายทีละไฟล์ไปยัง process pool และรับกลับเฉพาะส่วนต่าง — หน่วยความจำไม่โตตามขนาด archive"""
+    from concurrent.futures import ProcessPoolExecutor
+    days = archive_days(start, end)
+    if not days:
+        print("ℹ️ ไม่พบข้อมูลในช่วงวันที่ที่เลือก")
+        return
+    tasks = [(OUTPUT_DIR, day, date_str) for day, date_str in days.items()]
+    started = time.perf_counter()
+    checked = 0
+    by_rule = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for day, n, dropped, added in executor.map(_replay_day, tasks):
+            checked += n
+            for url, title, reason in dropped:
+                by_rule.setdefault(f"- {reason}", []).append((day, url, title))
+            for url, title, reason in added:
+                by_rule.setdefault(f"+ เดิมถูกตัดด้วย {reason}", []).append((day, url, title))
+
+    elapsed = time.perf_counter() - started
+    n_drop = sum(len(v) for k, v in by_rule.items() if k.startswith("-"))
+    n_add = sum(len(v) for k, v in by_rule.items() if k.startswith("+"))
+    print(f"🔁 Replay {len(days)} วัน ({checked:,} แถว) ใน {elapsed:.1f} วินาที: ตัดออก {n_drop}, เพิ่มเข้า {n_add}")
+    for rule, items in sorted(by_rule.items(), key=lambda kv: -len(kv[1])):
+        print(f"\n{rule}  ({len(items)} URLs)")
+        for day, url, title in items[:show]:
+            print(f"   {day}  {title[:50]}  {url}")
+        if len(items) > show:
+            print(f"   ... อีก {len(items) - show} รายการ")
+
+# ==========================================
+# METRICS
+# ==========================================
+# เวลาแต่ละขั้นตอน + สถิติต่อ (query, tbs) ของแต่ละรอบ ใช้ดูว่า query ไหนคุ้มค่า API credit และ hit ถูกตัดเพราะอะไร
+_spans = {}
+
+@contextmanager
+def span(stage):
+    """จับเวลาขั้นตอนของ pipeline (เรียกซ้ำชื่อเดิมได้ เวลาจะถูกรวมกัน)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _spans[stage] = _spans.get(stage, 0.0) + time.perf_counter() - started
+
+def _new_query_stats():
+    return {"raw": 0, "duplicate": 0, "rejected": Counter(), "valid": 0, "new": 0, "seconds": 0.0, "failed": False}
+
+def _reject_category(reason):
+    # "Negative Word: ขายฝาก" -> "Negative Word" (เหตุผลแบบละเอียดอยู่ใน archive/*.rejected.ndjson.gz แล้ว)
+    return reason.split(":", 1)[0] or "Unknown"
+
+def _prom_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def write_step_outputs(**outputs):
+    """ส่งค่าให้ step ถัดไปของ GitHub Actions ผ่านไฟล์ $GITHUB_OUTPUT (รันนอก Actions จะไม่ทำอะไร)"""
+    path = os.getenv("GITHUB_OUTPUT")
+    if not path:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        for key, value in outputs.items():
+            f.write(f"{key}={value}\n")
+
+def write_metrics(run_at, all_jobs, skipped_jobs, query_stats, totals):
+    """ต่อท้ายสถิติของรอบนี้ 1 บรรทัดใน metrics/yyyy-mm.ndjson และเขียน Prometheus textfile (ถ้าตั้ง METRICS_PROM_FILE)
+    query อ้างด้วยลำดับใน search_config.json (index เริ่มที่ 1) — "config" คือ hash ของรายการ query ที่ใช้ในรอบนั้น
+    ถ้า hash เปลี่ยน index ของรอบก่อนหน้าอาจชี้ไปคนละ query"""
+    skipped = set(skipped_jobs)
+    queries = []
+    for i, raw_q, tbs in all_jobs:
+        st = query_stats.get((raw_q, tbs)) or _new_query_stats()
+        queries.append({
+            "index": i + 1,
+            "tbs": tbs,
+            "status": "skipped" if (i, raw_q, tbs) in skipped else ("failed" if st["failed"] else "run"),
+            "seconds": round(st["seconds"], 3),
+            "raw": st["raw"],
+            "duplicate": st["duplicate"],
+            "valid": st["valid"],
+            "new": st["new"],
+            "rejected": dict(st["rejected"]),
+        })
+    config_hash = hashlib.sha1("\n".join(load_config().queries).encode("utf-8")).hexdigest()[:12]
+    record = {
+        "run_at": run_at.strftime("%Y-%m-%dT%H:%M:%S+07:00"),
+        "config": config_hash,
+        "stages_sec": {stage: round(sec, 3) for stage, sec in _spans.items()},
+        "totals": totals,
+        "queries": [[q[field] for field in METRICS_QUERY_FIELDS] for q in queries],
+        "http": {endpoint: dict(st, total_ms=round(st["total_ms"], 1), max_ms=round(st["max_ms"], 1))
+                 for endpoint, st in sorted(_http_stats.items())},
+    }
+    os.makedirs(os.path.join(OUTPUT_DIR, METRICS_DIR), exist_ok=True)
+    filepath = os.path.join(OUTPUT_DIR, METRICS_DIR, run_at.strftime("%Y-%m.ndjson"))
+    with open(filepath, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    if METRICS_PROM_FILE:
+        lines = [
+            "# HELP auction_stage_seconds Wall time of each pipeline stage in the last run.",
+            "# TYPE auction_stage_seconds gauge",
+        ]
+        lines += [f'auction_stage_seconds{{stage="{stage}"}} {sec:.3f}' for stage, sec in record["stages_sec"].items()]
+        lines += [
+            "# HELP auction_query_hits Hits per query/tbs in the last run by outcome.",
+            "# TYPE auction_query_hits gauge",
+        ]
+        for q in queries:
+            labels = f'index="{q["index"]}",tbs="{q["tbs"]}"'  # ข้อความ query อยู่ใน search_config.json (ยาวเกินจะเป็น label)
+            for kind in ("raw", "duplicate", "valid", "new"):
+                lines.append(f'auction_query_hits{{{labels},outcome="{kind}"}} {q[kind]}')
+            for reason, n in q["rejected"].items():
+                lines.append(f'auction_query_hits{{{labels},outcome="rejected",reason="{_prom_label(reason)}"}} {n}')
+        lines += [
+            "# HELP auction_query_seconds Latency of each query/tbs in the last run (0 when skipped by the scheduler).",
+            "# TYPE auction_query_seconds gauge",
+        ]
+        lines += [f'auction_query_seconds{{index="{q["index"]}",tbs="{q["tbs"]}"}} {q["seconds"]}' for q in queries]
+        lines += [
+            "# HELP auction_last_run_timestamp_seconds Unix time of the last finished run.",
+            "# TYPE auction_last_run_timestamp_seconds gauge",
+            f"auction_last_run_timestamp_seconds {time.time():.0f}",
+        ]
+        with atomic_write(METRICS_PROM_FILE) as f:
+            f.write("\n".join(lines) + "\n")
+    return filepath
+
+FRESHNESS_RANK = {'1d': 0, '7d': 1, '1m': 2}
+
+def _report_sort_key(r):
+    """ลำดับในรายงาน: ช่วงเวลาที่สดที่สุดก่อน แล้วเรียงตาม title"""
+    return (FRESHNESS_RANK.get(r.get('_found_in', '7d'), 1), r.get('title', ''))
+
+def insert_sorted(rows, keys, new_rows):
+    """แทรก new_rows ลง rows ที่เรียงแล้ว (keys[i] = _report_sort_key(rows[i])) ด้วย bisect
+    ไม่ต้อง sort ทั้งวันใหม่ทุกรอบ — Python 3.9 ยังไม่มี bisect(key=...) จึงเก็บ keys คู่ขนานไว้"""
+    for r in new_rows:
+        k = _report_sort_key(r)
+        i = bisect.bisect_right(keys, k)
+        keys.insert(i, k)
+        rows.insert(i, r)
+
+def merge_batches(jobs, batches, all_results, found_at, rejected=None, stats=None, upgraded=None):
+    """รวมผลของแต่ละ job ตามลำดับ jobs: ตัด URL ซ้ำ (ทั้งกับ all_results และในรอบนี้) + กรองด้วย result_verdict
+    คืน (candidates {url: hit}, origin {url: (query, tbs)} ของ job แรกที่พบ URL นั้น)
+    URL ที่ซ้ำแต่รอบนี้เจอในช่วงเวลาที่สดกว่า (เช่นเดิม 7d แล้วติด qdr:d) จะถูกยกระดับ _found_in
+    ถ้าส่ง set upgraded มา จะเก็บ URL ใน all_results ที่ถูกยกระดับ (พร้อมตั้ง _upgraded_at = found_at)
+    ถ้าส่ง dict rejected มา จะเก็บ hit ที่ถูกกรองออกพร้อมเหตุผลไว้ด้วย (ใช้ตอน replay ว่ากฎใหม่จะ "เพิ่ม" อะไร)
+    ถ้าส่ง dict stats มา จะนับ raw / duplicate / rejected ตามเหตุผล / valid แยกตาม (query, tbs)"""
+    candidates = {}
+    origin = {}
+    for (i, raw_q, tbs), batch in zip(jobs, batches):
+        tag = '1d' if tbs == 'qdr:d' else ('7d' if tbs == 'qdr:w' else '1m')
+        st = stats.setdefault((raw_q, tbs), _new_query_stats()) if stats is not None else None
+        for r in batch:
+            url = r.get('link')
+            if st is not None:
+                st["raw"] += 1
+            if not url or url in all_results or url in candidates:
+                known = candidates.get(url) or all_results.get(url)
+                if known is not None and FRESHNESS_RANK[tag] < FRESHNESS_RANK.get(known.get('_found_in'), 1):
+                    known['_found_in'] = tag
+                    if url not in candidates:
+                        known['_upgraded_at'] = found_at
+                        if upgraded is not None:
+                            upgraded.add(url)
+                if st is not None:
+                    st["duplicate"] += 1
+                continue
+            if rejected is not None and url in rejected:
+                if st is not None:
+                    st["rejected"][_reject_category(rejected[url].get('_reject', ''))] += 1
+                continue
+            valid, reason = result_verdict(url, r.get('title',''), r.get('snippet',''))
+            if valid:
+                r.update({'_found_in': tag, '_found_at': found_at})
+                candidates[url] = r
+                origin[url] = (raw_q, tbs)
+                if st is not None:
+                    st["valid"] += 1
+            else:
+                if rejected is not None:
+                    rejected[url] = dict(r, _found_in=tag, _found_at=found_at, _reject=reason)
+                if st is not None:
+                    st["rejected"][_reject_category(reason)] += 1
+    return candidates, origin
+
 def main():
+    if _cassette_mode != "replay":
+        try:
+            serper_api_key()  # ตรวจ key ก่อนเริ่ม จะได้ไม่ต้องรอให้ทุก query ล้มทีละตัว
+        except RuntimeError as e:
+            import sys
+            print(e)
+            sys.exit(1)
+    cfg = load_config()
+    queries = cfg.queries
+
     ict_now = get_ict_now()
     date_str = ict_now.strftime('%d_%m_%Y')
     all_results = load_daily_json(date_str)
+    archived = archive_snapshot(all_results)
     
-    print(f"🚀 Processing {len(QUERIES)} queries with Hybrid-Regional-Agency strategy...")
-    for i, raw_q in enumerate(QUERIES):
-        q = raw_q.replace('"', '').strip() 
-        
+    # สร้างรายการงาน (query, tbs) ตามลำดับเดิม เพื่อให้ผลลัพธ์ merge ได้ลำดับคงที่ทุกครั้ง
+    jobs = []
+    for i, raw_q in enumerate(queries):
         tfs = ["qdr:d", "qdr:w"]
         # Special frequency for stable domains or deep province search (once a month check sometimes catches deep indexes)
-        if any(s in raw_q for s in ["webportal.bangkok.go.th", ".prd.go.th", "site:ac.th"]): 
+        if any(s in raw_q for s in cfg.monthly_query_markers): 
             tfs = ["qdr:m"]
-
         for tbs in tfs:
-            print(f"[{i+1}/{len(QUERIES)}] Querying: {q[:60]}...")
-            batch = search_serper(raw_q, tbs) 
-            tag = '1d' if tbs == 'qdr:d' else ('7d' if tbs == 'qdr:w' else '1m')
-            for r in batch:
-                url = r.get('link')
-                if url and url not in all_results and is_valid_result(url, r.get('title',''), r.get('snippet','')):
-                    r.update({'_found_in': tag, '_found_at': ict_now.strftime('%H:%M')})
-                    all_results[url] = r
-
-    save_daily_json(date_str, all_results)
-    priority = {'1d': 0, '7d': 1, '1m': 2}
-    sorted_list = sorted(all_results.values(), key=lambda x: (priority.get(x.get('_found_in','7d'), 1), x.get('title','')))
-    generate_html_report(sorted_list, date_str)
-    generate_index_html()
-    print(f"✅ Finished. Report generated for {date_str}.")
-
-    # ✅ บันทึกลง Supabase crawler_results
-    print("\n📦 กำลังบันทึกลง Supabase...")
-    save_to_supabase(sorted_list)
-
-    # ✅ เพิ่ม domain ใหม่เข้า crawler pool
-    print("\n🌐 กำลังเพิ่ม domain ใหม่เข้า pool...")
-    add_new_domains(sorted_list)
-
-if __name__ == "__main__": main()
+            jobs.append((i, raw_q, tbs))
+
+    state_db = open_state_db()
+    all_jobs = jobs
+    jobs, skipped_jobs = plan_jobs(state_db, all_jobs, ict_now)
+    deep_jobs = deep_candidates(state_db, jobs)
+    known_urls = frozenset(all_results)
+
+    print(f"🚀 Processing {len(queries)} queries ({len(jobs)} requests, {SERPER_WORKERS} workers) with Hybrid-Regional-Agency strategy...")
+
+    query_stats = {(raw_q, tbs): _new_query_stats() for _, raw_q, tbs in jobs}
+
+    def run_job(job):
+        i, raw_q, tbs = job
+        q = raw_q.replace('"', '').strip() 
+        print(f"[{i+1}/{len(queries)}] Querying ({tbs}): {q[:60]}...")
+        started = time.perf_counter()
+        try:
+            if (raw_q, tbs) in deep_jobs:
+                return search_serper_deep(raw_q, tbs, known_urls, SERPER_DEEP_PAGES)
+            return search_serper(raw_q, tbs)
+        finally:
+            query_stats[(raw_q, tbs)]["seconds"] = time.perf_counter() - started
+
+    # executor.map คืนผลตามลำดับของ jobs เสมอ ไม่ว่า request ไหนจะเสร็จก่อน
+    with span("search"), ThreadPoolExecutor(max_workers=max(1, SERPER_WORKERS)) as executor:
+        batches = list(executor.map(run_job, jobs))
+    # call ที่ล้มเหลว (None) ต้องไม่ถูกบันทึกเป็นรอบที่ yield = 0 — ไม่อย่างนั้น scheduler จะข้าม/ลดความถี่ query นั้นทั้งวัน
+    failed_jobs = [job for job, batch in zip(jobs, batches) if batch is None]
+    for _, raw_q, tbs in failed_jobs:
+        query_stats[(raw_q, tbs)]["failed"] = True
+    batches = [batch or [] for batch in batches]
+
+    today = _report_date(date_str)
+    with span("filter"):
+        rejected = load_rejected(date_str)
+        rejected_archived = archive_snapshot(rejected)
+        upgraded = set()
+        candidates, origin = merge_batches(jobs, batches, all_results, ict_now.strftime('%H:%M'), rejected, query_stats, upgraded)
+
+        # เทียบกับดัชนี URL ข้ามวัน: ที่เคยรายงานไปแล้วในวันก่อนจะไม่ถูกแสดง/upsert ซ้ำ (qdr:w เจอซ้ำได้ถึง 7 วัน)
+        seen = lookup_seen_urls(state_db, candidates)
+        skipped = 0
+        job_yields = {(raw_q, tbs): 0 for _, raw_q, tbs in jobs if not query_stats[(raw_q, tbs)]["failed"]}
+        added = []
+        for url, r in candidates.items():
+            if SKIP_SEEN_URLS and url in seen and seen[url][0] < today:
+                skipped += 1
+                continue
+            all_results[url] = r
+            added.append(url)
+            job_yields[origin[url]] += 1
+        for key, n in job_yields.items():
+            query_stats[key]["new"] = n
+    with span("persist"):
+        save_rejected(date_str, rejected, rejected_archived)
+        record_seen_urls(state_db, list(candidates) + list(all_results), today)
+        record_query_yield(state_db, job_yields, ict_now)
+        # URL ที่รอบก่อนของวันนี้เคยผ่านมาแล้ว: อยู่ใน archive/rejected ของวันนี้ หรือถูกข้ามเพราะเคยรายงานแต่ last_seen เป็นวันนี้
+        counted_today = known_urls.union(rejected_archived, (url for url, st in seen.items() if st[1] == today))
+        update_domain_stats(state_db, batches, today, counted_today)
+    print(f"🆕 พบ URL ใหม่ {len(candidates) - skipped} รายการ, ข้าม {skipped} รายการที่เคยรายงานแล้ว, ยกระดับเป็น 1d {len(upgraded)} รายการ")
+    print(f"💰 Scheduler: ยิง {len(jobs)}/{len(all_jobs)} calls, ประหยัด {len(skipped_jobs)} calls ในรอบนี้"
+          + (f", ล้มเหลว {len(failed_jobs)} calls (จะยิงใหม่รอบหน้า)" if failed_jobs else ""))
+
+    # cron-job.org เรียก workflow หลายครั้งต่อวัน — รอบที่ไม่มี hit ใหม่/ยกระดับ ไม่ต้อง render/บันทึก/upsert ซ้ำ
+    changed = bool(added or upgraded) or not os.path.exists(os.path.join(OUTPUT_DIR, f"result_{date_str}_daily.html"))
+    if changed:
+        # แถวเดิมเรียงอยู่แล้ว (ไฟล์ archive เขียนตามลำดับรายงาน) — sort แถวเดิมแล้วแทรกเฉพาะแถวใหม่/ที่ยกระดับด้วย bisect
+        moved = upgraded.union(added)
+        sorted_list = sorted((r for url, r in all_results.items() if url not in moved), key=_report_sort_key)
+        insert_sorted(sorted_list, [_report_sort_key(r) for r in sorted_list], [all_results[url] for url in moved])
+        # รวมประกาศเดียวกันที่มาจากหลาย URL — แสดง/บันทึกเฉพาะตัวแทนกลุ่ม ส่วน URL อื่นเป็นลิงก์สำรอง
+        with span("cluster"):
+            duplicates = cluster_near_duplicates(state_db, sorted_list, today)
+        with span("extract"):
+            hits = extract_hits(sorted_list)
+        report_hits = [h for h in hits if not h.dup_of]
+        report_rows = len(report_hits)
+        print(f"🧩 Near-duplicate: รวม {duplicates} รายการเข้ากับประกาศที่ซ้ำกัน เหลือ {report_rows} รายการในรายงาน")
+        with span("persist"):
+            written = save_daily_json(date_str, {r['link']: r for r in sorted_list}, archived)
+        print(f"🗄️ Archive: เขียน {written}/{len(sorted_list)} แถว")
+        with span("render"):
+            report_path = generate_html_report(report_hits, date_str)
+            manifest = update_manifest(date_str, report_rows, report_path)
+            generate_index_html(manifest, months={_report_date(date_str)[:7]})
+        with span("search_index"):
+            build_search_index(months={today[:7]})
+        print(f"✅ Finished. Report generated for {date_str}.")
+
+        with span("supabase"):
+            # ✅ บันทึกลง Supabase crawler_results
+            print("\n📦 กำลังบันทึกลง Supabase...")
+            save_to_supabase(report_hits, state_db)
+
+            # ✅ เพิ่ม domain ใหม่เข้า crawler pool
+            print("\n🌐 กำลังเพิ่ม domain ใหม่เข้า pool...")
+            add_new_domains(hits, state_db)
+    else:
+        duplicates = sum(1 for r in all_results.values() if r.get('_dup_of'))
+        report_rows = len(all_results) - duplicates
+        print(f"💤 ไม่มี URL ใหม่หรือที่ยกระดับ — ใช้รายงาน {date_str} เดิม ({report_rows} รายการ)")
+
+    # รายงานไม่เปลี่ยนก็ยังต้อง commit ถ้า state/ เปลี่ยน — รอบที่ yield = 0 คือสิ่งที่ scheduler ใช้เรียนรู้ว่า query ไหน low-yield
+    state_changed = close_state_db(state_db)
+    write_step_outputs(changed="true" if changed or state_changed else "false")
+    print_http_stats()
+
+    sums = {k: sum(st[k] for st in query_stats.values()) for k in ("raw", "duplicate", "valid", "new")}
+    totals = dict(
+        sums,
+        jobs_run=len(jobs),
+        jobs_skipped=len(skipped_jobs),
+        jobs_failed=len(failed_jobs),
+        rejected=sum(sum(st["rejected"].values()) for st in query_stats.values()),
+        skipped_seen=skipped,
+        near_duplicates=duplicates,
+        report_rows=report_rows,
+        upgraded=len(upgraded),
+    )
+    metrics_path = write_metrics(ict_now, all_jobs, skipped_jobs, query_stats, totals)
+    dead = [st for st in query_stats.values() if st["new"] == 0 and not st["failed"]]
+    print(f"📈 Metrics: {metrics_path} ({len(dead)}/{len(query_stats)} calls ไม่ได้ URL ใหม่เลย)")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Daily auction search report")
+    commands = parser.add_subparsers(dest="command")
+    run_cmd = commands.add_parser("run", help="ค้นหาและสร้างรายงานประจำวัน (ค่าเริ่มต้น)")
+    run_cmd.add_argument("--record", metavar="CASSETTE", help="บันทึก response ของ Serper ทุก (query, tbs) ลงไฟล์ .ndjson.gz")
+    run_cmd.add_argument("--replay", metavar="CASSETTE", help="ใช้ response จาก cassette แทนการยิง Serper (ไม่ใช้ network)")
+    run_cmd.add_argument("--scale", type=int, default=1, help="(replay) ขยายทุก response เป็น N เท่า เพื่อ load test")
+    run_cmd.add_argument("--output-dir", help="โฟลเดอร์ที่ใช้เขียนรายงาน/archive/state แทน OUTPUT_DIR")
+    run_cmd.add_argument("--supabase-sink", metavar="SQLITE", help="เขียนลง SQLite แทน Supabase (replay ใช้ <output-dir>/supabase_sink.sqlite)")
+    migrate_cmd = commands.add_parser("migrate", help="แปลง result_*.json เดิมเป็น archive/*.ndjson.gz")
+    migrate_cmd.add_argument("--delete", action="store_true", help="ลบ result_*.json เดิมหลังแปลงสำเร็จ")
+    replay_cmd = commands.add_parser("replay", help="กรองข้อมูลย้อนหลังทั้งหมดด้วยกฎปัจจุบัน แล้วรายงาน URL ที่จะถูกตัด/เพิ่ม")
+    replay_cmd.add_argument("--from", dest="start", help="วันเริ่มต้น yyyy-mm-dd")
+    replay_cmd.add_argument("--to", dest="end", help="วันสิ้นสุด yyyy-mm-dd")
+    replay_cmd.add_argument("--workers", type=int, default=None, help="จำนวน process (ค่าเริ่มต้น = จำนวน CPU)")
+    replay_cmd.add_argument("--show", type=int, default=5, help="จำนวนตัวอย่าง URL ที่แสดงต่อกฎ")
+    commands.add_parser("build-search", help="สร้างดัชนีค้นหาข้ามวัน (search/ + search.html) จาก archive ทั้งหมด")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate_archive(delete=args.delete)
+    elif args.command == "replay":
+        replay(args.start, args.end, workers=args.workers, show=args.show)
+    elif args.command == "build-search":
+        build_search_index()
+    else:
+        if getattr(args, "replay", None):
+            # replay ห้ามแตะ state / archive / รายงานจริง (supabase_sync ที่ถูก mark จาก sink จะทำให้รอบจริงไม่ส่งแถวนั้นอีก)
+            repo_dirs = {os.path.abspath(OUTPUT_DIR), os.path.dirname(os.path.abspath(__file__))}
+            if not args.output_dir:
+                args.output_dir = tempfile.mkdtemp(prefix="replay_")
+                print(f"📂 Replay: เขียนผลลงโฟลเดอร์ชั่วคราว {args.output_dir}")
+            elif os.path.abspath(args.output_dir) in repo_dirs:
+                parser.error("--replay ต้องใช้ --output-dir ที่ไม่ใช่โฟลเดอร์ของ repo/OUTPUT_DIR จริง")
+        if getattr(args, "output_dir", None):
+            OUTPUT_DIR = args.output_dir
+            os.makedirs(OUTPUT_DIR, exist_ok=True)
+        if getattr(args, "supabase_sink", None):
+            SUPABASE_SINK = args.supabase_sink
+        if getattr(args, "replay", None):
+            # replay ต้องไม่เขียนลง Supabase จริง และยิงทุก query ที่มีใน cassette (ไม่ให้ scheduler ข้าม)
+            SUPABASE_SINK = SUPABASE_SINK or os.path.join(OUTPUT_DIR, "supabase_sink.sqlite")
+            FORCE_ALL_QUERIES = True
+            open_cassette(args.replay, "replay", scale=args.scale)
+        elif getattr(args, "record", None):
+            open_cassette(args.record, "record")
+        try:
+            main()
+        finally:
+            close_cassette()
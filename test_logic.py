@@ -1,57 +1,6 @@
-
-def is_valid_result(url, title, snippet):
-    # เว็บไซต์ที่จะกรองออกในระดับ Python (Sync กับ daily_search.py)
-    NEGATIVE_DOMAINS = [
-        "dailynews.co.th", "line.me", "auct.co.th", "mgronline.com", 
-        "sia.co.th", "bam.co.th", "threads.net", "naewna.com"
-    ]
-    
-    # คำศัพท์ที่จะกรองออก (Sync กับ daily_search.py)
-    NEGATIVE_WORDS = [
-        "รปภ", "มือสอง", "ทุบตึก", "ตัวแทน", "เช่าซื้อ", "อาคารพาณิชย์", "ขายอาคาร",
-        "บังคับคดี", "รอขาย", "ธนาคารยึด", "ที่土地", "ธนาคาร", "ไหม",
-        "ยึดบ้าน", "วางแนวยึด", "อายัด", "ยึดอายัด", "คู่มือปฏิบัติงาน"
-    ]
-    # "อย่างไร" ถูกลบออกตามสั่ง
-    
-    # คำสำคัญที่ต้องมี (Sync กับ daily_search.py)
-    HIGHLIGHT_WORDS = [
-        "ขายทอดตลาด", "จำหน่าย", "ประกาศขาย", "เสื่อมสภาพ", "ชำรุด", "ไม่จำเป็นต้องใช้งาน",
-        "ไม่จำเป็นต้องใช้ในราชการ", "\"โดยวิธีขายทอดตลาด\"", "\"ขายทอดตลาดพัสดุ\"", 
-        "\"ไม่จำเป็นต้องใช้ในราชการ\"", "\"พัสดุชำรุดเสื่อมสภาพ\"", "\"ขายทอดตลาดครุภัณฑ์\""
-    ]
-
-    combined_text = f"{title} {snippet}".lower()
-    
-    # 1. ตรวจสอบ Domain ยกลเว้น
-    for domain in NEGATIVE_DOMAINS:
-        if domain in url.lower():
-            return False, f"Negative Domain: {domain}"
-
-    # 2. ตรวจสอบคำยกเว้น
-    for word in NEGATIVE_WORDS:
-        if word in combined_text:
-            return False, f"Negative Word: {word}"
-            
-    # 3. ตรวจสอบรูปแบบ Menu/Sitemap
-    menu_indicators = [" · ", " | ", " > ", " - "]
-    separator_count = 0
-    for sep in menu_indicators:
-        separator_count += combined_text.count(sep)
-    if separator_count >= 3:
-        return False, "Likely Menu/Sitemap"
-
-    # 4. ต้องมี Keyword สำคัญอย่างน้อย 1 คำ
-    has_keyword = False
-    for word in HIGHLIGHT_WORDS:
-        if word in title or word in snippet:
-            has_keyword = True
-            break
-            
-    if not has_keyword:
-        return False, "No Keywords Found"
-        
-    return True, "Valid"
+# ใช้กฎกรองชุดเดียวกับ daily_search.py (อ่านจาก search_config.json) — ไม่ต้องคัดลอกรายการคำมาไว้ที่นี่
+# import ได้โดยไม่ต้องมี SERPER_API_KEY เพราะ key ถูก resolve เฉพาะตอนยิง network
+from daily_search import result_verdict as is_valid_result
 
 # --- TEST CASES ---
 test_cases = [
@@ -62,7 +11,7 @@ test_cases = [
     {"url": "https://www.gprocurement.go.th/view", "title": "ประกาศผู้ชนะการเสนอราคาประกอบการขาย", "snippet": "ประกาศผู้ชนะการเสนอราคา (กรณีนี้ควรผ่านถ้าไม่มีคำลบอื่นๆ)..."}
 ]
 
-print("Testing is_valid_result with NEW HYBRID logic:")
+print("Testing is_valid_result (daily_search.result_verdict):")
 for tc in test_cases:
     valid, reason = is_valid_result(tc["url"], tc["title"], tc["snippet"])
     print(f"[{tc['url'][:20]}...] Valid: {valid}, Reason: {reason}")
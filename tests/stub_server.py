@@ -0,0 +1,133 @@
+"""Stub server ของ Serper + Supabase (PostgREST) สำหรับรันเทสต์/รันทั้ง pipeline โดยไม่ใช้ network
+
+ใช้ในเทสต์:
+    with StubServer() as stub:
+        stub.fail("/search", 503, 503)          # 2 request ถัดไปของ /search ได้ 503
+        ds.SERPER_URL = stub.url("/search")
+
+รันเป็น server แยก (ชี้ SERPER_URL / SUPABASE_URL มาที่นี่แล้วรัน daily_search.py):
+    python tests/stub_server.py --port 8765
+"""
+import hashlib
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_ROWS = [
+    {"title": "ประกาศเทศบาลตำบลหนองบัว เรื่อง ขายทอดตลาดพัสดุชำรุด", "link": "https://nongbua.go.th/news/{n}",
+     "snippet": "เทศบาลตำบลหนองบัว ประกาศขายทอดตลาดครุภัณฑ์ชำรุด รถยนต์ส่วนกลาง จำนวน 2 คัน"},
+    {"title": "โรงพยาบาลเชียงกลาง ประกาศขายทอดตลาดครุภัณฑ์การแพทย์", "link": "https://chiangklang-hospital.go.th/auction/{n}",
+     "snippet": "โรงพยาบาลเชียงกลาง มีความประสงค์จะขายทอดตลาดพัสดุที่ไม่จำเป็นต้องใช้ในราชการ"},
+    {"title": "มหาวิทยาลัยราชภัฏ ประกาศจำหน่ายพัสดุโดยวิธีขายทอดตลาด", "link": "https://www.rru.ac.th/procurement/{n}",
+     "snippet": "ประกาศจำหน่ายพัสดุชำรุดเสื่อมสภาพ คอมพิวเตอร์ และเครื่องพิมพ์ โดยวิธีขายทอดตลาด"},
+]
+
+
+def serper_organic(query, tbs, page=1, count=20):
+    """ผล organic ที่กำหนดได้แน่นอนจาก (q, tbs, page) — ค้นซ้ำด้วยค่าเดิมได้ผลเดิมเสมอ"""
+    seed = int(hashlib.md5(f"{query}|{tbs}|{page}".encode("utf-8")).hexdigest(), 16)
+    rnd = random.Random(seed)
+    organic = []
+    for position in range(1, count + 1):
+        row = rnd.choice(STUB_ROWS)
+        organic.append({
+            "title": row["title"],
+            "link": row["link"].format(n=rnd.randrange(200)),
+            "snippet": row["snippet"],
+            "position": position,
+        })
+    return organic
+
+
+class StubServer:
+    """HTTP/1.1 keep-alive server ในเธรดแยก: POST /search ตอบแบบ Serper, path อื่นตอบ 201 แบบ PostgREST
+    บันทึกทุก request ไว้ใน requests (path, body ที่ parse แล้ว, พอร์ตของ client = 1 connection)"""
+
+    def __init__(self, port=0, organic_count=20):
+        self.requests = []
+        self._failures = {}
+        self._lock = threading.Lock()
+        self.organic_count = organic_count
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                payload = json.loads(body) if body else None
+                path = self.path.split("?", 1)[0]
+                with stub._lock:
+                    stub.requests.append((path, payload, self.client_address[1]))
+                    queue = stub._failures.get(path)
+                    failure = queue.pop(0) if queue else None
+                if failure is not None:
+                    status, headers = failure
+                    self.send_response(status)
+                    for key, value in headers.items():
+                        self.send_header(key, value)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if path == "/search":
+                    out = json.dumps({"organic": serper_organic(payload["q"], payload["tbs"], payload.get("page", 1),
+                                                                stub.organic_count)}).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                else:
+                    out = b""
+                    self.send_response(201)
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        return Handler
+
+    def url(self, path="/search"):
+        return f"http://127.0.0.1:{self._server.server_address[1]}{path}"
+
+    def fail(self, path, *statuses, headers=None):
+        """ให้ request ถัดๆ ไปของ path ตอบด้วย status ตามลำดับ (ก่อนกลับไปตอบปกติ)"""
+        with self._lock:
+            self._failures.setdefault(path, []).extend((status, headers or {}) for status in statuses)
+
+    def calls(self, path):
+        with self._lock:
+            return [r for r in self.requests if r[0] == path]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Stub server ของ Serper + Supabase")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server = StubServer(port=args.port)
+    print(f"🧪 Stub: SERPER_URL={server.url('/search')} SUPABASE_URL={server.url('')}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
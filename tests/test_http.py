@@ -0,0 +1,78 @@
+"""เทสต์ transport กลาง (http_request): retry/backoff เมื่อเจอ 429/5xx และการใช้ connection ซ้ำ — รันกับ stub ในเครื่อง"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import daily_search as ds
+from tests.stub_server import StubServer
+
+
+class HttpRequestTest(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubServer().start()
+        self.addCleanup(self.stub.stop)
+        ds._http_local.conns = {}
+        self.addCleanup(lambda: [conn.close() for conn in ds._http_local.conns.values()])
+        ds._http_stats.clear()
+        # backoff จริงรอเป็นวินาที — เก็บค่าที่ขอรอไว้ตรวจแทน
+        patcher = mock.patch.object(ds.time, "sleep")
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, path="/search", body=None):
+        body = body or {"q": "ขายทอดตลาด", "tbs": "qdr:d"}
+        return ds.http_request("POST", self.stub.url(path), body=ds.json.dumps(body).encode("utf-8"),
+                               headers={"Content-Type": "application/json"}, endpoint="test")
+
+    def test_retries_5xx_then_succeeds(self):
+        self.stub.fail("/search", 503, 502)
+        data = ds.json.loads(self.post())
+        self.assertTrue(data["organic"])
+        self.assertEqual(len(self.stub.calls("/search")), 3)
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertEqual(ds._http_stats["test"]["retries"], 2)
+
+    def test_429_honours_retry_after(self):
+        self.stub.fail("/search", 429, headers={"Retry-After": "7"})
+        self.post()
+        self.sleep.assert_called_once_with(7.0)
+
+    def test_backoff_is_capped_exponential_with_jitter(self):
+        with mock.patch.object(ds.random, "uniform", side_effect=lambda lo, hi: hi):
+            delays = [ds._backoff_delay(attempt) for attempt in range(8)]
+        self.assertEqual(delays[:3], [ds.HTTP_BACKOFF_BASE, ds.HTTP_BACKOFF_BASE * 2, ds.HTTP_BACKOFF_BASE * 4])
+        self.assertEqual(max(delays), ds.HTTP_BACKOFF_MAX)
+
+    def test_gives_up_after_max_retries(self):
+        self.stub.fail("/search", *[500] * (ds.HTTP_MAX_RETRIES + 1))
+        with self.assertRaises(RuntimeError):
+            self.post()
+        self.assertEqual(len(self.stub.calls("/search")), ds.HTTP_MAX_RETRIES + 1)
+
+    def test_4xx_is_not_retried(self):
+        self.stub.fail("/search", 401)
+        with self.assertRaises(RuntimeError):
+            self.post()
+        self.assertEqual(len(self.stub.calls("/search")), 1)
+        self.sleep.assert_not_called()
+
+    def test_reuses_keep_alive_connection(self):
+        for _ in range(5):
+            self.post()
+        self.post("/rest/v1/crawler_results", [{"url": "https://example.go.th/"}])
+        ports = {port for _, _, port in self.stub.requests}
+        self.assertEqual(len(ports), 1)
+
+    def test_search_serper_returns_none_when_retries_run_out(self):
+        self.stub.fail("/search", *[503] * (ds.HTTP_MAX_RETRIES + 1))
+        with mock.patch.object(ds, "SERPER_URL", self.stub.url("/search")), \
+             mock.patch.dict(os.environ, {"SERPER_API_KEY": "test"}):
+            self.assertIsNone(ds.search_serper("ขายทอดตลาด", "qdr:d"))
+            self.assertTrue(ds.search_serper("ขายทอดตลาด", "qdr:d"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+"""เทสต์การ merge หลายรอบต่อวัน: archive แบบต่อท้าย gzip member, การบีบอัดใหม่ตามสัดส่วน, การยกระดับ 7d→1d
+และ output changed=false ของรอบที่ไม่มีอะไรใหม่"""
+import contextlib
+import gzip
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import daily_search as ds
+from tests.stub_server import StubServer
+
+
+def _row(n, found_in="7d", title="ประกาศขายทอดตลาดพัสดุ"):
+    return {"title": f"{title} {n}", "link": f"https://example{n}.go.th/news", "snippet": "ขายทอดตลาด",
+            "_found_in": found_in, "_found_at": "08:00"}
+
+
+class ArchiveAppendTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.path = os.path.join(self.dir, "2026-01-01.ndjson.gz")
+
+    def lines(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            return [line for line in f if line.strip()]
+
+    def test_append_then_read_back_keeps_last_line(self):
+        rows = {r["link"]: r for r in (_row(n) for n in range(10))}
+        self.assertEqual(ds._save_archive(self.path, rows), 10)
+
+        before = ds.archive_snapshot(rows)
+        rows["https://example3.go.th/news"]["_found_in"] = "1d"
+        rows["https://example99.go.th/news"] = _row(99)
+        self.assertEqual(ds._save_archive(self.path, rows, before), 2)
+
+        self.assertEqual(len(self.lines()), 12)  # ต่อท้าย 2 บรรทัด ไม่ได้เขียนใหม่ทั้งไฟล์
+        read = list(ds._read_archive(self.path))
+        self.assertEqual(read, list(rows.values()))  # ลำดับตามที่พบครั้งแรก แถวที่ซ้ำใช้บรรทัดหลังสุด
+        self.assertEqual(read[3]["_found_in"], "1d")
+
+    def test_unchanged_rows_write_nothing(self):
+        rows = {r["link"]: r for r in (_row(n) for n in range(5))}
+        ds._save_archive(self.path, rows)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        self.assertEqual(ds._save_archive(self.path, rows, ds.archive_snapshot(rows)), 0)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_compacts_when_superseded_lines_exceed_ratio(self):
+        rows = {r["link"]: r for r in (_row(n) for n in range(10))}
+        ds._save_archive(self.path, rows)
+        limit = int(len(rows) * ds.ARCHIVE_COMPACT_RATIO)
+        # แทนที่ทีละแถวจนบรรทัดเก่าเท่ากับเพดานพอดี — ยังต่อท้ายอยู่
+        for n in range(limit):
+            before = ds.archive_snapshot(rows)
+            rows[f"https://example{n}.go.th/news"]["_found_at"] = f"09:{n:02d}"
+            ds._save_archive(self.path, rows, before)
+        self.assertEqual(len(self.lines()), len(rows) + limit)
+        # เกินเพดาน — เขียนใหม่ทั้งไฟล์ เหลือ 1 บรรทัดต่อแถว
+        before = ds.archive_snapshot(rows)
+        rows["https://example9.go.th/news"]["_found_at"] = "10:00"
+        self.assertEqual(ds._save_archive(self.path, rows, before), len(rows))
+        self.assertEqual(len(self.lines()), len(rows))
+        self.assertEqual(list(ds._read_archive(self.path)), list(rows.values()))
+
+
+class MergeUpgradeTest(unittest.TestCase):
+    def test_upgrades_known_url_seen_in_day_window(self):
+        known = _row(1, found_in="7d")
+        all_results = {known["link"]: known}
+        upgraded = set()
+        hit = {k: known[k] for k in ("title", "link", "snippet")}
+        candidates, _ = ds.merge_batches([(0, "q", "qdr:d")], [[hit]], all_results, "12:30", upgraded=upgraded)
+        self.assertEqual(candidates, {})
+        self.assertEqual(upgraded, {known["link"]})
+        self.assertEqual(known["_found_in"], "1d")
+        self.assertEqual(known["_upgraded_at"], "12:30")
+        self.assertEqual(known["_found_at"], "08:00")  # เวลาที่พบครั้งแรกไม่เปลี่ยน
+
+    def test_never_downgrades(self):
+        known = _row(1, found_in="1d")
+        upgraded = set()
+        hit = {k: known[k] for k in ("title", "link", "snippet")}
+        ds.merge_batches([(0, "q", "qdr:w")], [[hit]], {known["link"]: known}, "12:30", upgraded=upgraded)
+        self.assertEqual(upgraded, set())
+        self.assertEqual(known["_found_in"], "1d")
+        self.assertNotIn("_upgraded_at", known)
+
+    def test_insert_sorted_matches_full_sort(self):
+        rows = [_row(n, found_in=("1d", "7d", "1m")[n % 3]) for n in range(30)]
+        base = sorted(rows[:20], key=ds._report_sort_key)
+        keys = [ds._report_sort_key(r) for r in base]
+        ds.insert_sorted(base, keys, rows[20:])
+        self.assertEqual(base, sorted(rows, key=ds._report_sort_key))
+        self.assertEqual(keys, [ds._report_sort_key(r) for r in base])
+
+
+class ChangedOutputTest(unittest.TestCase):
+    """รัน main() สองรอบติดกันกับ stub — รอบที่สองไม่มี URL ใหม่ ต้องได้ changed=false"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        stub = StubServer().start()
+        self.addCleanup(stub.stop)
+        self.output = os.path.join(self.dir, "github_output")
+        for patcher in (
+            mock.patch.object(ds, "OUTPUT_DIR", self.dir),
+            mock.patch.object(ds, "SERPER_URL", stub.url("/search")),
+            mock.patch.object(ds, "SUPABASE_URL", stub.url("")),
+            mock.patch.object(ds, "METRICS_PROM_FILE", None),
+            mock.patch.dict(os.environ, {"SERPER_API_KEY": "test", "GITHUB_OUTPUT": self.output}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_main(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            ds.main()
+
+    def outputs(self):
+        with open(self.output, encoding="utf-8") as f:
+            return f.read().split()
+
+    def query_runs(self):
+        with open(os.path.join(self.dir, ds.STATE_DIR, "query_stats.ndjson"), encoding="utf-8") as f:
+            return {(q, tbs): runs for q, tbs, _, runs, _ in map(ds.json.loads, f)}
+
+    def test_second_run_without_new_hits_is_unchanged(self):
+        self.run_main()
+        # ทุก call ยังไม่หมด TTL — รอบที่สองไม่ยิงอะไรเลย state จึงไม่เปลี่ยน
+        with mock.patch.dict(ds.QUERY_TTL_HOURS, {"qdr:d": 24}):
+            self.run_main()
+        self.assertEqual(self.outputs(), ["changed=true", "changed=false"])
+
+    def test_zero_yield_run_keeps_scheduler_state(self):
+        self.run_main()
+        before = self.query_runs()
+        self.run_main()  # qdr:d ยิงซ้ำได้ URL เดิมทั้งหมด (yield = 0) — ต้อง commit เพื่อให้ scheduler นับรอบนี้
+        self.assertEqual(self.outputs(), ["changed=true", "changed=true"])
+        after = self.query_runs()
+        self.assertTrue(all(after[key] == runs + (key[1] == "qdr:d") for key, runs in before.items()))
+
+    def test_each_run_appends_one_metrics_line(self):
+        self.run_main()
+        self.run_main()
+        files = os.listdir(os.path.join(self.dir, ds.METRICS_DIR))
+        self.assertEqual(files, [ds.get_ict_now().strftime("%Y-%m.ndjson")])
+        with open(os.path.join(self.dir, ds.METRICS_DIR, files[0]), encoding="utf-8") as f:
+            records = [ds.json.loads(line) for line in f]
+        self.assertEqual(len(records), 2)
+        queries = ds.load_config().queries
+        for record in records:
+            self.assertTrue(all(len(q) == len(ds.METRICS_QUERY_FIELDS) for q in record["queries"]))
+            self.assertNotIn(queries[0], ds.json.dumps(record, ensure_ascii=False))  # อ้าง query ด้วย index
+
+
+if __name__ == "__main__":
+    unittest.main()
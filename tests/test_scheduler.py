@@ -0,0 +1,101 @@
+"""เทสต์ scheduler (TTL ต่อ tbs, การยืดรอบของ query ที่ yield ต่ำ) และการข้าม URL ที่เคยรายงานในวันก่อน
+รัน main() หลายรอบกับ stub โดยเลื่อนเวลา get_ict_now()"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from collections import Counter
+from datetime import datetime, timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import daily_search as ds
+from tests.stub_server import StubServer
+
+DAY1 = datetime(2026, 3, 2, 8, 0)
+
+
+class PlanJobsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        with mock.patch.object(ds, "OUTPUT_DIR", self.dir):
+            self.conn = ds.open_state_db()
+        self.addCleanup(self.conn.close)
+
+    def plan(self, tbs, last_run, runs, ewma, now):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO query_stats VALUES (?, ?, ?, ?, ?)",
+                              ("q", tbs, last_run.isoformat(timespec="minutes"), runs, ewma))
+        to_run, skipped = ds.plan_jobs(self.conn, [(0, "q", tbs)], now)
+        return bool(to_run)
+
+    def test_day_window_runs_every_time_until_low_yield(self):
+        self.assertTrue(self.plan("qdr:d", DAY1, 10, 3.0, DAY1 + timedelta(minutes=5)))
+        self.assertTrue(self.plan("qdr:d", DAY1, ds.LOW_YIELD_MIN_RUNS - 1, 0.0, DAY1 + timedelta(minutes=5)))
+
+    def test_low_yield_query_backs_off(self):
+        ttl = ds.LOW_YIELD_TTL_HOURS["qdr:d"]
+        runs = ds.LOW_YIELD_MIN_RUNS
+        self.assertFalse(self.plan("qdr:d", DAY1, runs, 0.1, DAY1 + timedelta(hours=ttl) - timedelta(minutes=1)))
+        self.assertTrue(self.plan("qdr:d", DAY1, runs, 0.1, DAY1 + timedelta(hours=ttl)))
+
+    def test_week_window_is_daily(self):
+        self.assertFalse(self.plan("qdr:w", DAY1, 1, 3.0, DAY1.replace(hour=23, minute=59)))
+        self.assertTrue(self.plan("qdr:w", DAY1, 1, 3.0, DAY1 + timedelta(days=1) - timedelta(hours=8)))
+
+
+class MultiRunTest(unittest.TestCase):
+    """main() หลายรอบในวันเดียวกันและวันถัดไป"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.stub = StubServer().start()
+        self.addCleanup(self.stub.stop)
+        for patcher in (
+            mock.patch.object(ds, "OUTPUT_DIR", self.dir),
+            mock.patch.object(ds, "SERPER_URL", self.stub.url("/search")),
+            mock.patch.object(ds, "SUPABASE_URL", self.stub.url("")),
+            mock.patch.object(ds, "METRICS_PROM_FILE", None),
+            mock.patch.dict(os.environ, {"SERPER_API_KEY": "test"}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_main(self, now):
+        self.stub.requests.clear()
+        with mock.patch.object(ds, "get_ict_now", return_value=now), contextlib.redirect_stdout(io.StringIO()):
+            ds.main()
+        return Counter(payload["tbs"] for _, payload, _ in self.stub.calls("/search"))
+
+    def test_week_window_skipped_until_next_day(self):
+        first = self.run_main(DAY1)
+        self.assertGreater(first["qdr:w"], 0)
+        same_day = self.run_main(DAY1 + timedelta(hours=4))
+        self.assertEqual(same_day["qdr:w"], 0)
+        self.assertEqual(same_day["qdr:m"], 0)
+        self.assertEqual(same_day["qdr:d"], first["qdr:d"])
+        next_day = self.run_main(DAY1 + timedelta(days=1))
+        self.assertEqual(next_day, first)
+
+    def test_urls_reported_yesterday_are_not_shown_again(self):
+        day1, day2 = DAY1.strftime("%d_%m_%Y"), (DAY1 + timedelta(days=1)).strftime("%d_%m_%Y")
+        self.run_main(DAY1)
+        reported = ds.load_daily_json(day1)
+        self.assertTrue(reported)
+        # รอบถัดไปของวันเดียวกัน: URL ที่พบวันนี้ยังอยู่ในรายงานของวันนี้ครบ
+        self.run_main(DAY1 + timedelta(hours=4))
+        self.assertEqual(list(ds.load_daily_json(day1)), list(reported))
+        # stub คืนผลเดิมทุกครั้งที่ค้น (q, tbs) เดิม — วันถัดไปทุก URL เคยรายงานแล้ว จึงไม่แสดง/ไม่ upsert ซ้ำ
+        self.run_main(DAY1 + timedelta(days=1))
+        self.assertEqual(ds.load_daily_json(day2), {})
+        self.assertEqual(self.stub.calls("/rest/v1/crawler_results"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""เทสต์การ sync ลง Supabase แบบส่งเฉพาะส่วนต่าง: status/found_date ส่งเฉพาะแถวใหม่, แถวที่ไม่เปลี่ยนไม่ถูกส่ง
+และแถวที่เขียนลง sink (SQLite แทน Supabase) ต้องไม่ถูก mark ว่า sync แล้ว — รันกับ stub ในเครื่อง"""
+import contextlib
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import daily_search as ds
+from tests.stub_server import StubServer
+
+
+def _raw(n, title="ประกาศขายทอดตลาดพัสดุ"):
+    return {"title": f"{title} {n}", "link": f"https://example{n}.go.th/news/{n}", "snippet": "ขายทอดตลาดครุภัณฑ์ชำรุด"}
+
+
+class SupabaseSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.stub = StubServer().start()
+        self.addCleanup(self.stub.stop)
+        ds._http_local.conns = {}
+        self.addCleanup(lambda: [conn.close() for conn in ds._http_local.conns.values()])
+        for patcher in (
+            mock.patch.object(ds, "OUTPUT_DIR", self.dir),
+            mock.patch.object(ds, "SUPABASE_URL", self.stub.url("")),
+            mock.patch.object(ds, "SUPABASE_SINK", None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.state_db = ds.open_state_db()
+        self.addCleanup(self.state_db.close)
+
+    def save(self, raws):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return ds.save_to_supabase(ds.extract_hits(raws), self.state_db)
+
+    def sent(self):
+        """payload ของแต่ละ request ที่ส่งไป crawler_results นับจากครั้งก่อนที่เรียก"""
+        batches = [payload for _, payload, _ in self.stub.calls("/rest/v1/crawler_results")]
+        self.stub.requests.clear()
+        return batches
+
+    def test_new_rows_carry_status_and_updates_omit_it(self):
+        raws = [_raw(n) for n in range(5)]
+        self.save(raws)
+        rows = [row for batch in self.sent() for row in batch]
+        self.assertEqual(len(rows), 5)
+        self.assertTrue(all(row["status"] == "unread" and row["found_date"] for row in rows))
+
+        raws[2] = _raw(2, title="ประกาศขายทอดตลาดรถยนต์")  # เนื้อหาเปลี่ยน — แถวเดิมใน Supabase
+        raws.append(_raw(9))                                # แถวใหม่
+        self.assertEqual(self.save(raws), 2)
+        batches = self.sent()
+        self.assertEqual(len(batches), 2)  # ทุกแถวใน request เดียวต้องมี key ชุดเดียวกัน
+        new, updated = sorted(batches, key=lambda batch: "status" not in batch[0])
+        self.assertEqual([row["url"] for row in new], [raws[5]["link"]])
+        self.assertEqual(new[0]["status"], "unread")
+        self.assertEqual([row["url"] for row in updated], [raws[2]["link"]])
+        self.assertNotIn("status", updated[0])
+        self.assertNotIn("found_date", updated[0])
+
+    def test_unchanged_rows_are_not_sent(self):
+        raws = [_raw(n) for n in range(5)]
+        self.save(raws)
+        self.sent()
+        self.assertEqual(self.save(raws), 0)
+        self.assertEqual(self.sent(), [])
+
+    def test_keyword_hit_follows_highlight_words_order(self):
+        raw = {"title": "ประกาศขาย พัสดุชำรุดเสื่อมสภาพ", "link": "https://example.go.th/a",
+               "snippet": "โดยวิธีขายทอดตลาดพัสดุ"}
+        self.save([raw])
+        words = ds.load_config().highlight_words
+        expected = next(kw for kw in words if kw in raw["snippet"] or kw in raw["title"])
+        self.assertEqual(self.sent()[0][0]["keyword_hit"], expected)
+
+    def test_sink_rows_are_never_marked_synced(self):
+        sink = os.path.join(self.dir, "supabase_sink.sqlite")
+        raws = [_raw(n) for n in range(5)]
+        with mock.patch.object(ds, "SUPABASE_SINK", sink), contextlib.redirect_stdout(io.StringIO()):
+            ds.update_domain_stats(self.state_db, [raws], "2026-01-01")
+            hits = ds.extract_hits(raws)
+            self.assertEqual(ds.save_to_supabase(hits, self.state_db), 5)
+            self.assertEqual(ds.add_new_domains(hits, self.state_db), 5)
+        self.assertEqual(self.sent(), [])  # ไม่มีการยิง network
+        conn = sqlite3.connect(sink)
+        self.addCleanup(conn.close)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM crawler_results").fetchone()[0], 5)
+        self.assertEqual(self.state_db.execute("SELECT COUNT(*) FROM supabase_sync").fetchone()[0], 0)
+        self.assertEqual(self.state_db.execute(
+            "SELECT COUNT(*) FROM domain_stats WHERE pushed_index_url IS NOT NULL").fetchone()[0], 0)
+
+        # รอบจริงถัดไปต้องส่งครบทุกแถว
+        self.assertEqual(self.save(raws), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()